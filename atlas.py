@@ -0,0 +1,116 @@
+import json
+import os
+import sys
+
+import pygame
+import utils
+from utils import DEFAULTDIR, load_scaled
+
+# prebuilt sprite atlas. every image the game uses is packed, already scaled
+# to the sizes it is drawn at, into one png that is read in a single load at
+# startup and cut into subsurfaces up front. sizes first requested at
+# runtime are added to the atlas on exit so later launches get them too
+#
+#   python3 atlas.py        (re)build the atlas
+
+ATLAS_IMAGE = os.path.join(DEFAULTDIR, "atlas.png")
+ATLAS_INDEX = os.path.join(DEFAULTDIR, "atlas.json")
+MAX_WIDTH = 2048
+
+# (image, width, height) of everything the game draws
+GAME_IMAGES = [
+    ("background.png", 900, 600),
+    ("ammo.png", 50, 50),
+    ("scope.png", 100, 100),
+    ("crate.png", 100, 100),
+    ("none.png", 100, 100),
+    ("canpooper_right_angry.png", 50, 50),
+    ("canpooper_left_angry.png", 50, 50),
+    ("canpooper_right_angry_dead.png", 50, 50),
+    ("canpooper_left_angry_dead.png", 50, 50),
+]
+
+def source_mtime(image):
+    return os.path.getmtime(os.path.join(DEFAULTDIR, image))
+
+# shelf packing, tallest images first. returns {key: (x, y)} and the size
+def pack(sizes):
+    positions = {}
+    x = y = shelf_height = width = 0
+    for key in sorted(sizes, key=lambda k: (-sizes[k][1], -sizes[k][0])):
+        w, h = sizes[key]
+        if x + w > MAX_WIDTH:
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+        positions[key] = (x, y)
+        x += w
+        width = max(width, x)
+        shelf_height = max(shelf_height, h)
+    return positions, (max(width, 1), max(y + shelf_height, 1))
+
+def build(keys):
+    # convert_alpha() in load_scaled needs a display mode
+    if pygame.display.get_surface() is None:
+        if not pygame.display.get_init():
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            pygame.display.init()
+        pygame.display.set_mode((1, 1))
+
+    keys = sorted(set(keys))
+    surfaces = {key: load_scaled(*key) for key in keys}
+    positions, size = pack({key: surface.get_size() for key, surface in surfaces.items()})
+
+    sheet = pygame.Surface(size, pygame.SRCALPHA)
+    sheet.fill((0, 0, 0, 0))
+    for key, surface in surfaces.items():
+        # add onto transparent black = exact copy (a normal blit would blend)
+        sheet.blit(surface, positions[key], special_flags=pygame.BLEND_RGBA_ADD)
+
+    pygame.image.save(sheet, ATLAS_IMAGE)
+    with open(ATLAS_INDEX, "w") as f:
+        json.dump({
+            "images": [[*key, *positions[key]] for key in keys],
+            "sources": {image: source_mtime(image) for image, _, _ in keys},
+        }, f, indent=1)
+
+def read_index():
+    if not (os.path.exists(ATLAS_INDEX) and os.path.exists(ATLAS_IMAGE)):
+        return None
+    with open(ATLAS_INDEX) as f:
+        return json.load(f)
+
+# cut the atlas into utils.atlas_images. entries whose source png changed
+# since the atlas was built are skipped (and picked up again on save())
+def load():
+    if utils.atlas_images:
+        return
+    index = read_index()
+    if index is None:
+        return
+
+    sheet = pygame.image.load(ATLAS_IMAGE).convert_alpha()
+    for image, width, height, x, y in index["images"]:
+        if index["sources"].get(image) != source_mtime(image):
+            continue
+        utils.atlas_images[(image, width, height)] = sheet.subsurface((x, y, width, height))
+
+# rebuild the atlas if images were loaded that it doesn't have yet
+def save():
+    if not utils.new_images:
+        return
+    index = read_index()
+    keys = set(utils.new_images)
+    if index is not None:
+        keys.update((image, w, h) for image, w, h, _, _ in index["images"])
+    build(keys)
+    utils.new_images.clear()
+
+if __name__ == "__main__":
+    keys = set(GAME_IMAGES)
+    index = read_index()
+    if index is not None:
+        keys.update((image, w, h) for image, w, h, _, _ in index["images"])
+    build(keys)
+    print(f"packed {len(keys)} images into {ATLAS_IMAGE}")
+    sys.exit(0)
@@ -0,0 +1,205 @@
+import argparse
+import json
+import random
+import sys
+import time
+
+from main import Game
+from utils import text_cache
+
+# scripted benchmark scenarios for the per-frame hot paths
+#
+#   python3 bench.py                        run everything and print a table
+#   python3 bench.py --save base.json       also save results as a baseline
+#   python3 bench.py --compare base.json    compare against a saved baseline
+#   python3 bench.py --only enemies_1000 bullets_aoe
+#   python3 bench.py --enemy-store          use the numpy enemy store
+#   python3 bench.py --dirty-rects          use dirty rectangle rendering
+
+# game methods timed as separate phases, in the order they run in a frame
+PHASES = {
+    "shots": "fire",
+    "hits": "resolve_shots",
+    "enemies": "update_enemies",
+    "popups": "update_popups",
+    "spawns": "update_spawns",
+    "draw": "draw",
+}
+
+# slowdown (new time / baseline time) reported as a regression
+REGRESSION_THRESHOLD = 1.10
+
+def add_enemies(game, count, rng):
+    for _ in range(count):
+        enemy = game.spawn_enemy(
+            (rng.randint(0, game.world_width - 50), rng.randint(0, game.world_height - 50)))
+        if rng.random() < 0.5:
+            enemy.change_dir()
+
+def add_crates(game, count, rng):
+    for _ in range(count):
+        x = rng.randint(0, game.world_width - 100)
+        y = rng.randint(0, game.world_height - 100)
+        game.add_crate((x, y), (100, 100))
+
+# shoot at random enemies (half of them aimed off-center)
+def fire_at_enemies(game, count, rng, aoe=False):
+    enemies = game.enemies.sprites()
+    if not enemies:
+        return
+    for _ in range(count):
+        target = rng.choice(enemies)
+        x, y = target.rect.center
+        x += rng.randint(-20, 20)
+        y += rng.randint(-20, 20)
+        if aoe:
+            bullet = game.bullet_pool.acquire((x, y), dmg=120,
+                aoe_dmg=60, aoe_range=100, apply_aoe_dropoff=True)
+        else:
+            bullet = game.bullet_pool.acquire((x, y), dmg=120,
+                aoe_dmg=0, aoe_range=0, apply_aoe_dropoff=False)
+        game.fire(bullet, game.timer.get_ticks())
+
+class Scenario:
+    def __init__(self, name, enemies=0, crates=0, bullets=0, aoe=False, hurt=False,
+            level=None, scroll=(0, 0)):
+        self.name = name
+        self.enemies = enemies # enemies alive at the start
+        self.crates = crates # extra crates on top of the level's
+        self.bullets = bullets # shots fired every frame
+        self.aoe = aoe
+        self.hurt = hurt # start enemies below comfort hp so they panic and hide
+        self.level = level # level file, None for the default level
+        self.scroll = scroll # direction the camera keeps scrolling in
+
+    def setup(self, game, rng):
+        game.spawn_queue.clear() # keep the enemy count fixed
+        game.scroll_dir = self.scroll
+        add_crates(game, self.crates, rng)
+        add_enemies(game, self.enemies, rng)
+        if self.hurt:
+            for enemy in game.enemies:
+                enemy.hp = enemy.max_hp - 1
+
+    def before_frame(self, game, rng):
+        if self.bullets:
+            fire_at_enemies(game, self.bullets, rng, self.aoe)
+
+SCENARIOS = [
+    Scenario("enemies_10", enemies=10),
+    Scenario("enemies_100", enemies=100),
+    Scenario("enemies_1000", enemies=1000),
+    Scenario("enemies_10000", enemies=10000),
+    Scenario("bullets_direct", enemies=500, bullets=20),
+    Scenario("bullets_aoe", enemies=500, bullets=20, aoe=True),
+    Scenario("crates_200", enemies=500, crates=200),
+    Scenario("hide_peek", enemies=500, hurt=True),
+    Scenario("big_world", enemies=5000, crates=1000, level="levels/big.json", scroll=(1, 1)),
+]
+
+# wrap a bound method so its run time is added to totals[phase]
+def timed(method, phase, totals):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        res = method(*args, **kwargs)
+        totals[phase] += time.perf_counter() - start
+        return res
+    return wrapper
+
+def run_scenario(scenario, frames=120, warmup=10, seed=0, **options):
+    rng = random.Random(seed)
+    game = Game(headless=True, seed=seed, level=scenario.level, **options)
+    scenario.setup(game, rng)
+
+    totals = dict.fromkeys(PHASES, 0.0)
+    for phase, method in PHASES.items():
+        setattr(game, method, timed(getattr(game, method), phase, totals))
+
+    for frame in range(warmup + frames):
+        if frame == warmup:
+            for phase in totals:
+                totals[phase] = 0.0
+            text_cache.hits = text_cache.misses = 0
+            start = time.perf_counter()
+        scenario.before_frame(game, rng)
+        game.step()
+        game.draw()
+        game.timer.advance()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "frames": frames,
+        "fps": frames / elapsed,
+        "frame_ms": elapsed * 1000 / frames,
+        "phases_ms": {phase: t * 1000 / frames for phase, t in totals.items()},
+        "enemies_left": len(game.enemies),
+        "popups_left": len(game.popup_text),
+        "text_cache": {"hits": text_cache.hits, "misses": text_cache.misses},
+    }
+
+def print_results(results, baseline=None):
+    header = f"{'scenario':<16}{'fps':>10}{'frame ms':>10}"
+    header += "".join(f"{phase:>10}" for phase in PHASES)
+    if baseline:
+        header += f"{'vs base':>10}"
+    print(header)
+
+    regressions = []
+    for name, res in results.items():
+        line = f"{name:<16}{res['fps']:>10.1f}{res['frame_ms']:>10.3f}"
+        line += "".join(f"{res['phases_ms'][phase]:>10.3f}" for phase in PHASES)
+        if baseline and name in baseline:
+            ratio = res["frame_ms"] / baseline[name]["frame_ms"]
+            line += f"{ratio:>9.2f}x"
+            if ratio > REGRESSION_THRESHOLD:
+                regressions.append(name)
+        print(line)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PooperHunt scenario benchmarks")
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", metavar="SCENARIO")
+    parser.add_argument("--enemy-store", action="store_true",
+        help="run with the numpy struct-of-arrays enemy store")
+    parser.add_argument("--dirty-rects", action="store_true",
+        help="render with dirty rectangles instead of full redraws")
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a JSON baseline")
+    args = parser.parse_args(argv)
+
+    scenarios = SCENARIOS
+    if args.only:
+        scenarios = [s for s in SCENARIOS if s.name in args.only]
+
+    results = {}
+    for scenario in scenarios:
+        results[scenario.name] = run_scenario(scenario, args.frames, seed=args.seed,
+            enemy_store=args.enemy_store, dirty_rects=args.dirty_rects)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["scenarios"]
+
+    regressions = print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "frames": args.frames,
+                "seed": args.seed,
+                "enemy_store": args.enemy_store,
+                "dirty_rects": args.dirty_rects,
+                "scenarios": results,
+            }, f, indent=2)
+
+    if regressions:
+        print("regressions: " + ", ".join(regressions))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
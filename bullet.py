@@ -1,17 +1,29 @@
 import math
+from spatial import SpatialHash
 
 class Bullet:
+    # bullets are created on every shot, slots keep them small and quick to
+    # allocate (and they are reused through a pool.Pool)
+    __slots__ = ("x", "y", "distance", "damage", "aoe_damage", "aoe_range",
+        "apply_aoe_dropoff")
+
     def __init__(self,
             spawn=(0, 0),
-            speed=5,
             dmg=100,
             aoe_dmg=100,
             aoe_range=0, # <= 0 if no aoe
             apply_aoe_dropoff=True):
-        
+        self.reset(spawn, dmg, aoe_dmg, aoe_range, apply_aoe_dropoff)
+
+    # (re)initialize, same arguments as the constructor
+    def reset(self,
+            spawn=(0, 0),
+            dmg=100,
+            aoe_dmg=100,
+            aoe_range=0,
+            apply_aoe_dropoff=True):
         self.x, self.y = spawn
-        self.speed = speed # m/frame
-        self.distance = 0 # floor distance when it is being used
+        self.distance = 0 # depth the shot stopped at, see raycast()
         self.damage = dmg
         self.aoe_damage = aoe_dmg
         self.aoe_range = aoe_range
@@ -56,25 +68,37 @@ class Bullet:
         
         return max(0, dropoff)
 
-    def check_for_hit(self, group, check_aoe=True):
-        res = []
-        for entity in group:
-            # check if entity is too far away
-            if entity.distance > math.floor(self.distance):
-                continue
+    # resolve the whole shot in one call. the enemies under the shot
+    # (SpatialHash.query_point(), or query_radius() for aoe) are walked in
+    # order of depth (distance) from near to far, and the walk stops at the
+    # first crate in the way (see crate_depth()) or past max_distance. crates win ties (an
+    # enemy at the same depth as a crate is behind it). enemies is a
+    # SpatialHash or an enemy_store.EnemyStore. returns the enemies hit,
+    # nearest first, and leaves distance at the depth the shot stopped at
+    def raycast(self, crates, enemies, max_distance):
+        blocked_at = self.crate_depth(crates)
+        self.distance = min(blocked_at, max_distance)
 
-            if self.aoe_range <= 0 and entity.lies_on(self.x, self.y):
-                res.append(entity)
-                continue
+        if not isinstance(enemies, SpatialHash):
+            return enemies.raycast(self, blocked_at, max_distance)
 
-            entity_x, entity_y = entity.rect.center
-            dx = entity_x - self.x
-            dy = entity_y - self.y
-            entity_dist = math.sqrt(dx**2 + dy**2)
+        if self.aoe_range <= 0:
+            hits = enemies.query_point(self.x, self.y)
+        else:
+            hits = enemies.query_radius(self.x, self.y, self.aoe_range)
+        hits.sort(key=lambda entity: entity.distance)
 
-            if self.aoe_range > 0 and entity_dist <= self.aoe_range and check_aoe:
-                res.append(entity)
+        res = []
+        for entity in hits:
+            if entity.distance >= blocked_at or entity.distance > max_distance:
+                break
+            res.append(entity)
         return res
 
-    def move(self): # called per frame
-        self.distance += self.speed
+    # depth of the nearest crate under the shot (a SpatialHash of crates),
+    # inf if there is none. aoe shots go over crates
+    def crate_depth(self, crates):
+        if self.aoe_range > 0:
+            return float("inf")
+        return min((crate.distance for crate in crates.query_point(self.x, self.y)),
+            default=float("inf"))
@@ -0,0 +1,39 @@
+import pygame
+
+# viewport over the world. everything in the game lives in world coordinates
+# (the level's size), the camera is the part of the world shown in the play
+# area of the screen: screen position = world position - (camera x, y). a
+# level no larger than the view never scrolls, world and screen coincide
+
+class Camera:
+    def __init__(self, world_width, world_height, view_width, view_height):
+        self.world_width = world_width
+        self.world_height = world_height
+        self.view_width = view_width
+        self.view_height = view_height
+        self.x = 0
+        self.y = 0
+        self.moved = False # moved since the last frame was drawn
+
+    # whether the whole world fits in the view
+    @property
+    def fixed(self):
+        return self.world_width <= self.view_width and self.world_height <= self.view_height
+
+    # put the top-left of the view at (x, y), kept inside the world
+    def move_to(self, x, y):
+        x = max(0, min(round(x), self.world_width - self.view_width))
+        y = max(0, min(round(y), self.world_height - self.view_height))
+        if (x, y) != (self.x, self.y):
+            self.x, self.y = x, y
+            self.moved = True
+
+    def scroll(self, dx, dy):
+        self.move_to(self.x + dx, self.y + dy)
+
+    # the part of the world in view
+    def view(self):
+        return pygame.Rect(self.x, self.y, self.view_width, self.view_height)
+
+    def to_world(self, pos):
+        return pos[0] + self.x, pos[1] + self.y
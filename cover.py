@@ -0,0 +1,99 @@
+from utils import distance, find_nearest
+
+# cover lookup for panicking and hiding enemies. crates never move, so the
+# play area is cut into a coarse grid and every cell (worked out the first
+# time cover is looked for in it) keeps only the crates that can be the nearest one (top-left to top-left, like
+# utils.find_nearest) to some point inside it: a crate is dropped from a
+# cell if it is further from every point of the cell than another crate is
+# from the cell's furthest point. finding cover is then a look at the few
+# crates of one cell instead of a scan over every crate
+#
+# enemies get the CoverIndex in place of the crate spatial.SpatialHash, it
+# answers the same query_enclosing() by passing it on
+
+class CoverIndex:
+    def __init__(self, crates, width, height, cell_size=50):
+        self.crates = crates # spatial.SpatialHash of the crates
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.cells = None # (cx, cy) -> [crate], built on first use
+        self.edges = {} # crate -> (left, right, top, bottom)
+
+    # the crates changed, rebuild on the next lookup
+    def invalidate(self):
+        self.cells = None
+
+    def build(self):
+        crates = list(self.crates)
+        self.edges = {crate: (crate.rect.left, crate.rect.right, crate.rect.top, crate.rect.bottom)
+            for crate in crates}
+        # cells are filled in as enemies look them up, a large world has
+        # far more cells than ever get asked about
+        self.cells = {}
+
+    # the crates kept for cell (cx, cy)
+    def build_cell(self, cx, cy):
+        size = self.cell_size
+        crates = list(self.edges)
+        x0, x1 = cx * size, (cx + 1) * size
+        y0, y1 = cy * size, (cy + 1) * size
+        # squared distance from the cell to each crate, nearest and furthest point
+        near = [axis_gap(crate.x, x0, x1)**2 + axis_gap(crate.y, y0, y1)**2
+            for crate in crates]
+        far = [max(abs(crate.x - x0), abs(crate.x - x1))**2 +
+               max(abs(crate.y - y0), abs(crate.y - y1))**2
+            for crate in crates]
+        bound = min(far, default=0)
+        # kept in crate order so ties resolve like find_nearest
+        cell = self.cells[(cx, cy)] = [crate for crate, d in zip(crates, near) if d <= bound]
+        return cell
+
+    # the crate nearest to the entity's top-left corner, same result as
+    # utils.find_nearest(entity, crates)
+    def nearest(self, entity):
+        if self.cells is None:
+            self.build()
+        x, y = entity.x, entity.y
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return find_nearest(entity, self.crates)
+
+        size = self.cell_size
+        nearest_d = float("inf")
+        nearest_crate = None
+        key = (int(x // size), int(y // size))
+        cell = self.cells.get(key)
+        if cell is None:
+            cell = self.build_cell(*key)
+        for crate in cell:
+            d = distance((x, y), (crate.x, crate.y))
+            if d <= nearest_d:
+                nearest_d = d
+                nearest_crate = crate
+        return nearest_crate
+
+    # (dx, dy) that move a box at (left, top, w, h) just out of the crate to
+    # the left, right, bottom and top, like utils.get_possible_displacement
+    def peek_offsets(self, crate, entity_xywh):
+        if self.cells is None:
+            self.build()
+        crate_left, crate_right, crate_top, crate_bottom = self.edges[crate]
+        left, top, w, h = entity_xywh
+        return [
+            (crate_left - (left + w), 0), # left
+            (crate_right - left, 0), # right
+            (0, crate_bottom - top), # down
+            (0, crate_top - (top + h)) # up
+        ]
+
+    # crates that fully enclose the entity
+    def query_enclosing(self, entity):
+        return self.crates.query_enclosing(entity)
+
+# distance from v to the range [low, high] along one axis
+def axis_gap(v, low, high):
+    if v < low:
+        return low - v
+    if v > high:
+        return v - high
+    return 0
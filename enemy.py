@@ -1,7 +1,10 @@
 from entity import Entity
-from utils import find_nearest, find_xy_speed, get_image, get_possible_displacement
+from scheduler import ActionScheduler
+from pool import Pool
+from timing import REFERENCE_STEP
+from sprites import SpriteSheet
+from utils import find_xy_speed
 import random
-import pygame
 import math
 
 MODES = ["wander", "panic", "hide"]
@@ -12,18 +15,32 @@ IMAGES = {
     "right_dead": "canpooper_right_angry_dead.png",
     "left_dead": "canpooper_left_angry_dead.png",
 }
+# enemies are drawn at 50x50 whatever their size
+SPRITES = SpriteSheet(IMAGES, 50, 50)
 
 class Action:
+    __slots__ = ("x_speed", "y_speed", "start", "duration", "y_acceleration")
+
     def __init__(self, dx, dy, start, duration, y_accel=0):
-        # assume 60 fps
-        self.x_speed = round(dx / (60 * (duration / 1000)))
-        self.y_speed = round(dy / (60 * (duration / 1000)))
+        self.reset(dx, dy, start, duration, y_accel)
+
+    def reset(self, dx, dy, start, duration, y_accel=0):
+        # speeds that cover (dx, dy) in duration ms, in pixels per
+        # timing.REFERENCE_STEP (rounded, so only roughly)
+        self.x_speed = round(dx / (duration / REFERENCE_STEP))
+        self.y_speed = round(dy / (duration / REFERENCE_STEP))
         self.start = start
         self.duration = duration # ms
-        self.y_acceleration = y_accel
+        self.y_acceleration = y_accel # pixels per reference step squared
+
+# actions are released back here once they end or are cancelled
+action_pool = Pool(Action)
 
 class Enemy(Entity):
     name = "enemy"
+    # staggers the ticks on which the enemy is updated while it is far from
+    # the view (see update_at_rate()), set by Game.spawn_enemy()
+    sim_phase = 0
     def __init__(self,
             image="canpooper_right_angry.png",
             spawn=(0, 0),
@@ -31,55 +48,89 @@ class Enemy(Entity):
             distance=100,
             hp=-1,
             x_speed=0,
-            y_speed=0):
+            y_speed=0,
+            scheduler=None,
+            rng=random,
+            panic_multiplier=2):
 
         super().__init__(image, spawn, size, distance, hp)
+        self.schedule_generation = 0 # bumped to invalidate scheduled events
+        self.scheduled = [] # pending actions for more complicated movement like peeking
+        self.reset_enemy(x_speed, y_speed, scheduler, rng, panic_multiplier)
 
+    # reuse a killed enemy (see pool.Pool), same arguments as the constructor
+    def reset(self,
+            image="canpooper_right_angry.png",
+            spawn=(0, 0),
+            size=(100, 100),
+            distance=100,
+            hp=-1,
+            x_speed=0,
+            y_speed=0,
+            scheduler=None,
+            rng=random,
+            panic_multiplier=2):
+        self.place(image, spawn, size, distance, hp)
+        self.reset_enemy(x_speed, y_speed, scheduler, rng, panic_multiplier)
+
+    def reset_enemy(self, x_speed, y_speed, scheduler, rng, panic_multiplier):
         # speed variables
         self.x_speed = x_speed
         self.y_speed = y_speed
         self.default_x_speed = x_speed
         self.default_y_speed = y_speed
-        self.panic_multiplier = 2 # amount speed is increased by when shot at
+        self.panic_multiplier = panic_multiplier # amount speed is increased by when shot at
 
         # enemy state variables
         self.goal_pos = None # (x, y) top-left position of goal crate
         self.goal_obj = None # goal crate object
         self.mode = "wander"
-        self.scheduled = [] # queue of scheduled actions for more complicated movement like peeking
+        self.cancel_actions()
+        self.action = None # action currently being executed
+        self.asleep = False # nothing to do until the scheduler wakes the enemy up
         self.recovery_time = float("inf") # time at which enemy stops hiding
         self.comfort_hp = self.max_hp # enemy panics if below comfort hp
         self.dead = False
+        self.facing_left = None # direction of self.image, set on the first update
+        self.rng = rng # random.Random (or the random module) for decisions
+
+        # actions are started and ended by a scheduler.ActionScheduler, shared
+        # by all enemies of a game. an enemy created without one drives its own
+        self.own_scheduler = scheduler is None
+        if scheduler is None:
+            scheduler = ActionScheduler()
+        self.scheduler = scheduler
     
-    def update(self, crates):
-        current_time = pygame.time.get_ticks()
-
-        # sort scheduled actions by start times
-        self.scheduled.sort(key=lambda a: a.start)
-
-        # iterate through actions
-        for i, action in enumerate(self.scheduled):
-            # delete action if it has finished completely
-            if action.start + action.duration < current_time:
-                self.scheduled.remove(action)
-            # execute the first action that is in process
-            elif action.start <= current_time <= action.start + action.duration:
-                self.x_speed = action.x_speed
-                self.y_speed = action.y_speed
-                # apply y-acceleration (and modify action's base y-speed as well)
-                self.y_speed += action.y_acceleration
-                self.scheduled[i].y_speed = self.y_speed
-                break
+    # crates is the level's cover.CoverIndex, dt the tick length in
+    # timing.REFERENCE_STEPs
+    def update(self, crates, current_time, dt=1):
+        if self.own_scheduler:
+            self.scheduler.advance(current_time)
+
+        # sleeping until the next scheduled event, unless shot at
+        if self.asleep and self.hp >= self.comfort_hp:
+            self.prev_x, self.prev_y = self.x, self.y
+            return
+        self.asleep = False
+
+        # execute the action in process
+        action = self.action
+        if action is not None:
+            self.x_speed = action.x_speed
+            self.y_speed = action.y_speed
+            # apply y-acceleration (and modify action's base y-speed as well)
+            self.y_speed += action.y_acceleration * dt
+            action.y_speed = self.y_speed
 
         # move
-        super().update()
+        super().update(dt)
         
         # play death animation if enemy dies. do not attempt to schedule if already 
     # dead, because then image will be changed to right_dead regardless of 
         # direction since x-speed is set to 0 by the death animation
         if self.hp <= 0 and not self.dead:
             self.dead = True
-            self.death_animation()
+            self.death_animation(current_time)
 
         # hide if shot at
         if self.hp < self.comfort_hp and self.mode != "panic":
@@ -88,32 +139,32 @@ class Enemy(Entity):
 
         # stop moving if enemy is now hiding behind a crate completely
         if self.mode == "panic":
-            for crate in crates:
-                if crate.encloses(self):
-                    self.mode = "hide"
-                    self.x_speed = 0
-                    self.y_speed = 0
-                    self.recovery_time = current_time + random.randint(8000, 18000)
+            for crate in crates.query_enclosing(self):
+                self.mode = "hide"
+                self.x_speed = 0
+                self.y_speed = 0
+                self.recovery_time = current_time + self.rng.randint(8000, 18000)
+                self.scheduler.wake_at(self, self.recovery_time)
 
         if self.mode == "hide":
             # continue wandering and clear scheduled actions if recovered
             # (basically reset to default behaviour)
             if current_time >= self.recovery_time:
                 self.mode = "wander"
-                self.scheduled = []
+                self.cancel_actions()
                 self.x_speed = self.default_x_speed
                 self.y_speed = self.default_y_speed
             else:
                 # schedule next peek if no more peeks are scheduled
                 if not self.scheduled:
-                    next_peek = random.randint(1000, 5000)
+                    next_peek = self.rng.randint(1000, 5000)
 
                     # get (dx, dy) for peeking up, down, left, right
-                    possible_peeks = get_possible_displacement(
+                    possible_peeks = crates.peek_offsets(
                         self.goal_obj, (self.x, self.y, self.width, self.height)) # cannot use self because not yet moved, change later
 
                     # find x, y, and diagonal displacement
-                    dx, dy = random.choice(possible_peeks)
+                    dx, dy = self.rng.choice(possible_peeks)
                     d_diag = math.sqrt(dx**2 + dy**2)
 
                     # peek
@@ -123,37 +174,73 @@ class Enemy(Entity):
                         dx=dx, dy=dy)
                     
                 # stop when enemy is back behind crate (badly written code)
-                if any(crate.encloses(self) for crate in crates):
+                if crates.query_enclosing(self):
                     self.x_speed = 0
                     self.y_speed = 0
         
-        # change image based on enemy direction
-        if self.x_speed < 0 and not self.dead:
-            self.image = get_image(IMAGES["left"], 50, 50)
-        elif self.x_speed >= 0 and not self.dead:
-            self.image = get_image(IMAGES["right"], 50, 50)
+        # change image when the enemy turns around
+        if not self.dead:
+            facing_left = self.x_speed < 0
+            if facing_left != self.facing_left:
+                self.facing_left = facing_left
+                self.image = SPRITES["left"] if facing_left else SPRITES["right"]
+
+        # hiding still behind a crate, nothing happens until the next peek
+        # starts or the enemy recovers
+        if (self.mode == "hide" and self.action is None and not self.dead and
+                self.x_speed == 0 and self.y_speed == 0):
+            self.asleep = True
 
     def schedule_action(self, action: Action):
         self.scheduled.append(action)
+        self.scheduler.add(self, action)
+
+    # drop every pending action (and any scheduled wake-up)
+    def cancel_actions(self):
+        if self.scheduled:
+            for action in self.scheduled:
+                action_pool.release(action)
+            self.scheduled = []
+        self.action = None
+        self.schedule_generation += 1
+
+    # called by the scheduler when an action starts
+    def start_action(self, action):
+        # the earliest started action runs first
+        if self.action is None or action.start < self.action.start:
+            self.action = action
+        self.asleep = False
+
+    # called by the scheduler when an action has finished
+    def end_action(self, action, current_time):
+        self.scheduled.remove(action)
+        if self.action is action:
+            started = [a for a in self.scheduled if a.start <= current_time]
+            self.action = min(started, key=lambda a: a.start) if started else None
+        self.asleep = False
+        action_pool.release(action)
+
+    def kill(self):
+        self.cancel_actions()
+        super().kill()
 
     # change direction (left/right)
     def change_dir(self):
         self.x_speed *= -1
     
     # play death animation (does not kill entity)
-    def death_animation(self):
+    def death_animation(self, current_time):
         # override currently scheduled actions in case enemy is in the middle of peeking
-        self.scheduled = []
+        self.cancel_actions()
 
         # change image to dead image
         if self.x_speed < 0:
-            self.image = get_image(IMAGES["left_dead"], 50, 50)
-        elif self.x_speed >= 0:
-            self.image = get_image(IMAGES["right_dead"], 50, 50)
+            self.image = SPRITES["left_dead"]
+        else:
+            self.image = SPRITES["right_dead"]
 
         # make enemy fall (with y-acceleration to imitate gravity)
-        current_time = pygame.time.get_ticks()
-        self.schedule_action(Action(0, -800, current_time, 1000, 0.8))
+        self.schedule_action(action_pool.acquire(0, -800, current_time, 1000, 0.8))
 
     # peek out from behind a crate
     def peek(self, start, duration, dx, dy):
@@ -163,15 +250,17 @@ class Enemy(Entity):
 #        dy //= 2
 
         # schedule actions for there-and-back
-        self.schedule_action(Action(dx, dy, start, duration))
-        self.schedule_action(Action(-dx, -dy, start + duration, duration))
+        self.schedule_action(action_pool.acquire(dx, dy, start, duration))
+        self.schedule_action(action_pool.acquire(-dx, -dy, start + duration, duration))
 
     # hide behind a crate
     def panic(self, crates):
+        # find nearest crate, keep wandering if the level has none
+        goal_obj = crates.nearest(self)
+        if goal_obj is None:
+            return
         self.mode = "panic"
-
-        # find nearest crate
-        self.goal_obj = find_nearest(self, crates)
+        self.goal_obj = goal_obj
         self.goal_pos = (self.goal_obj.x, self.goal_obj.y)
 
         # find what the diagonal speed would be normally
@@ -182,3 +271,16 @@ class Enemy(Entity):
         pos = (self.x, self.y)
         self.x_speed, self.y_speed = find_xy_speed(
             default_speed, pos, self.goal_pos)
+
+# update an enemy that may be far from the view. outside near (x0, y0, x1,
+# y1 in the world) it only updates every `every` ticks, covering them all
+# with one longer dt. enemies in the middle of an action always update,
+# actions are timed to the tick
+def update_at_rate(enemy, crates, current_time, dt, near, every, tick):
+    x0, y0, x1, y1 = near
+    if enemy.action is not None or (x0 <= enemy.x < x1 and y0 <= enemy.y < y1):
+        enemy.update(crates, current_time, dt)
+    elif (tick + enemy.sim_phase) % every == 0:
+        enemy.update(crates, current_time, dt * every)
+    else:
+        enemy.prev_x, enemy.prev_y = enemy.x, enemy.y
@@ -0,0 +1,233 @@
+import random
+import pygame
+from enemy import Enemy, MODES, SPRITES, update_at_rate
+
+# numpy is optional, only needed when Game(enemy_store=True)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+WANDER = MODES.index("wander")
+
+# enemy attributes kept in the store's arrays: name -> (dtype, python type)
+COLUMNS = {
+    "x": ("f8", float),
+    "y": ("f8", float),
+    "prev_x": ("f8", float), # position before the last tick
+    "prev_y": ("f8", float),
+    "width": ("i4", int),
+    "height": ("i4", int),
+    "distance": ("f8", float),
+    "x_speed": ("f8", float),
+    "y_speed": ("f8", float),
+    "hp": ("f8", float),
+    "max_hp": ("f8", float),
+    "comfort_hp": ("f8", float),
+    "mode": ("i1", None), # index into enemy.MODES
+    "dead": ("?", bool),
+    "asleep": ("?", bool),
+}
+
+# struct-of-arrays enemy store. every enemy's position, speed, hp, mode and
+# distance live in contiguous numpy arrays so wandering enemies (the vast
+# majority) are moved, turned around, culled and checked for death with a
+# handful of vectorized operations per frame. only enemies that are doing
+# something complicated (panicking, peeking, dying, damaged) run the normal
+# python Enemy.update()
+class EnemyStore:
+    def __init__(self, capacity=256, rng=random):
+        if np is None:
+            raise ImportError("the array-backed enemy store requires numpy")
+
+        self.capacity = capacity
+        self.size = 0 # high-water mark, slots >= size have never been used
+        for name, (dtype, _) in COLUMNS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.alive = np.zeros(capacity, dtype="?")
+        self.sprites = [None] * capacity
+        self.free = [] # released slots below self.size
+        self.rng = np.random.default_rng(rng.getrandbits(32))
+
+    def __len__(self):
+        return self.size - len(self.free)
+
+    # reserve a slot for a sprite, growing the arrays if needed
+    def allocate(self, sprite):
+        if self.free:
+            slot = self.free.pop()
+        else:
+            if self.size == self.capacity:
+                self.grow()
+            slot = self.size
+            self.size += 1
+        self.alive[slot] = True
+        self.sprites[slot] = sprite
+        return slot
+
+    def release(self, slot):
+        self.alive[slot] = False
+        self.sprites[slot] = None
+        self.free.append(slot)
+
+    def grow(self):
+        new_capacity = self.capacity * 2
+        for name in list(COLUMNS) + ["alive"]:
+            old = getattr(self, name)
+            new = np.zeros(new_capacity, dtype=old.dtype)
+            new[:self.capacity] = old
+            setattr(self, name, new)
+        self.sprites.extend([None] * (new_capacity - self.capacity))
+        self.capacity = new_capacity
+
+    # rows that need the full python update (sleeping enemies are woken up
+    # by the scheduler, or by getting shot)
+    def busy_mask(self):
+        n = self.size
+        return self.alive[:n] & (
+            ((self.mode[:n] != WANDER) & ~self.asleep[:n]) |
+            (self.hp[:n] < self.comfort_hp[:n]) |
+            (self.hp[:n] <= 0) |
+            self.dead[:n])
+
+    # move every enemy, run python updates for the busy ones, then kill the
+    # ones that left the world sideways or fell below it. returns the killed
+    # sprites. busy enemies outside near are updated every `every` ticks (see
+    # enemy.update_at_rate()), wandering ones move with the arrays every tick
+    def update(self, crates, current_time, width, height, dt=1, near=None, every=1, tick=0):
+        n = self.size
+        busy = self.busy_mask()
+        simple = self.alive[:n] & ~busy
+
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+        self.x[:n][simple] += self.x_speed[:n][simple] * dt
+        self.y[:n][simple] += self.y_speed[:n][simple] * dt
+
+        if near is None:
+            for slot in np.flatnonzero(busy):
+                self.sprites[slot].update(crates, current_time, dt)
+        else:
+            for slot in np.flatnonzero(busy):
+                update_at_rate(self.sprites[slot], crates, current_time, dt, near, every, tick)
+
+        x = self.x[:n]
+        offscreen = self.alive[:n] & ((x + self.width[:n] < 0) | (x > width) | (self.y[:n] > height))
+        killed = [self.sprites[slot] for slot in np.flatnonzero(offscreen)]
+        for sprite in killed:
+            sprite.kill()
+        return killed
+
+    # turn each enemy around with probability chance (ENEMY_STATE_CHANGE)
+    def change_dirs(self, chance=0.25):
+        n = self.size
+        flip = self.alive[:n] & (self.rng.random(n) < chance)
+        self.x_speed[:n][flip] *= -1
+        # hurt enemies are drawn with their sprite's image (see queue_draw),
+        # so turn it around with them. healthy ones are drawn from x_speed
+        # and get their image back from Enemy.update() once they are busy
+        for slot in np.flatnonzero(flip & ~self.dead[:n] & (self.hp[:n] != self.max_hp[:n])):
+            sprite = self.sprites[slot]
+            sprite.facing_left = bool(self.x_speed[slot] < 0)
+            sprite.image = SPRITES["left"] if sprite.facing_left else SPRITES["right"]
+
+    # enemies hit by a shot that stops at the first crate at depth
+    # blocked_at, nearest first (see Bullet.raycast())
+    def raycast(self, bullet, blocked_at, max_distance):
+        n = self.size
+        if n == 0:
+            return []
+        x, y = self.x[:n], self.y[:n]
+        w, h = self.width[:n], self.height[:n]
+        depth = self.distance[:n]
+        mask = self.alive[:n] & (depth < blocked_at) & (depth <= max_distance)
+        if bullet.aoe_range <= 0:
+            mask &= (x <= bullet.x) & (bullet.x <= x + w) & \
+                (y <= bullet.y) & (bullet.y <= y + h)
+        else:
+            # centers the same way pygame.Rect computes them
+            dx = np.trunc(x) + w // 2 - bullet.x
+            dy = np.trunc(y) + h // 2 - bullet.y
+            mask &= np.sqrt(dx**2 + dy**2) <= bullet.aoe_range
+        slots = np.flatnonzero(mask)
+        slots = slots[np.argsort(depth[slots], kind="stable")]
+        return [self.sprites[slot] for slot in slots]
+
+    # queue every enemy into a render.RenderBatch. healthy wandering enemies
+    # are queued straight from the arrays, the rest through
+    # Entity.queue_draw() for their image and hp bar. alpha interpolates
+    # positions like Entity.queue_draw(). with a view (x0, y0, x1, y1 in the
+    # world) only the enemies that overlap it are queued
+    def queue_draw(self, batch, alpha=1, view=None):
+        n = self.size
+        alive = self.alive[:n]
+        if view is not None:
+            x0, y0, x1, y1 = view
+            x, y = self.x[:n], self.y[:n]
+            alive = alive & (x < x1) & (x + self.width[:n] > x0) & \
+                (y < y1) & (y + self.height[:n] > y0)
+        fancy = self.busy_mask() | (self.alive[:n] & (self.hp[:n] != self.max_hp[:n]))
+        fancy &= alive
+        plain = np.flatnonzero(alive & ~fancy)
+
+        left = SPRITES["left"]
+        right = SPRITES["right"]
+        facing_left = (self.x_speed[plain] < 0).tolist()
+        x, y = self.x[plain], self.y[plain]
+        if alpha != 1:
+            x = x + (self.prev_x[plain] - x) * (1 - alpha)
+            y = y + (self.prev_y[plain] - y) * (1 - alpha)
+        batch.extend(
+            (left if is_left else right, pos)
+            for is_left, pos in zip(facing_left, zip(x.tolist(), y.tolist())))
+
+        for slot in np.flatnonzero(fancy):
+            self.sprites[slot].queue_draw(batch, alpha)
+
+def column(name, to_python):
+    def getter(self):
+        return to_python(getattr(self.store, name)[self.slot])
+    def setter(self, value):
+        getattr(self.store, name)[self.slot] = value
+    return property(getter, setter)
+
+def mode_column():
+    def getter(self):
+        return MODES[self.store.mode[self.slot]]
+    def setter(self, value):
+        self.store.mode[self.slot] = MODES.index(value)
+    return property(getter, setter)
+
+# enemy whose state lives in an EnemyStore row, the sprite itself is just a
+# view used by the python update path and for drawing
+class StoredEnemy(Enemy):
+    def __init__(self, store, *args, **kwargs):
+        self.store = store
+        self.slot = store.allocate(self)
+        super().__init__(*args, **kwargs)
+
+    # take a new row when reused after being killed (see pool.Pool)
+    def reset(self, *args, **kwargs):
+        if self.slot is None:
+            self.slot = self.store.allocate(self)
+        super().reset(*args, **kwargs)
+
+    # rect is derived from the stored position (assignments are ignored)
+    @property
+    def rect(self):
+        return pygame.Rect(self.x, self.y, self.width, self.height)
+
+    @rect.setter
+    def rect(self, value):
+        pass
+
+    def kill(self):
+        if self.slot is not None:
+            self.store.release(self.slot)
+            self.slot = None
+        super().kill()
+
+for _name, (_, _to_python) in COLUMNS.items():
+    if _to_python is not None:
+        setattr(StoredEnemy, _name, column(_name, _to_python))
+StoredEnemy.mode = mode_column()
@@ -1,5 +1,6 @@
 import pygame
 from utils import get_image
+from render import hp_bar
 
 class Entity(pygame.sprite.Sprite):
     name = "entity"
@@ -12,15 +13,23 @@ class Entity(pygame.sprite.Sprite):
 
         super().__init__()
 
+        # spatial.SpatialHash the entity is registered in (kept up to date on move)
+        self.spatial_index = None
+
+        self.place(image, spawn, size, distance, hp)
+
+    # (re)set location, size, image and hp (also used to reuse pooled entities)
+    def place(self, image="none.png", spawn=(0, 0), size=(100, 100), distance=100, hp=-1):
         # set location and size
         self.width, self.height = size
         self.x, self.y = spawn
+        self.prev_x, self.prev_y = self.x, self.y # position before the last tick
         self.distance = distance
 
-        # initialize self image
-        self.image = get_image(image, self.width, self.height)
-        self.rect = self.image.get_rect()
+        # initialize self image (None for entities that draw something else)
+        self.rect = pygame.Rect(0, 0, self.width, self.height)
         self.rect.topleft = (self.x, self.y)
+        self.image = get_image(image, self.width, self.height) if image is not None else None
 
         # speed (changed by child classes)
         self.x_speed = 0
@@ -33,35 +42,47 @@ class Entity(pygame.sprite.Sprite):
         if hp < 0:
             self.invulnerable = True
 
-    # draw entity on a screen
-    def draw(self, screen):
-        screen.blit(
-            self.image, (self.rect.center[0] - self.width/2, self.rect.center[1] - self.height/2))
+    # add the entity's blits (image, then hp bar if damaged) to a
+    # render.RenderBatch. alpha is how far into the current tick the frame
+    # is drawn (see Game.loop()), the entity is drawn between its previous
+    # and current position accordingly
+    def queue_draw(self, batch, alpha=1):
+        dx, dy = self.render_offset(alpha)
+        rect = self.rect
+        batch.add(self.image, (rect.x + dx, rect.y + dy))
         if self.hp != self.max_hp and not self.invulnerable:
-            self.draw_hp_bar(screen)
+            batch.add(hp_bar(self.width, self.hp / self.max_hp), (self.x + dx, self.y + dy - 15))
+
+    # offset from the current position to the interpolated one
+    def render_offset(self, alpha):
+        if alpha == 1:
+            return 0, 0
+        return (self.prev_x - self.x) * (1 - alpha), (self.prev_y - self.y) * (1 - alpha)
 
     # move an object (no collision detection)
     def move(self, dx, dy):
         self.y += dy
         self.x += dx
-        self.rect.move_ip((dx, dy))
+        # not move_ip(), fractional moves would be truncated away
+        self.rect.topleft = (self.x, self.y)
+        if self.spatial_index is not None:
+            self.spatial_index.update(self)
+
+    # remove from all groups and from the spatial index
+    def kill(self):
+        if self.spatial_index is not None:
+            self.spatial_index.remove(self)
+        super().kill()
 
-    # update (move, and kill if hp < 0)
-    def update(self):
-        self.move(self.x_speed, self.y_speed)
+    # update (move, and kill if hp < 0). dt is the tick length in
+    # timing.REFERENCE_STEPs
+    def update(self, dt=1):
+        self.prev_x, self.prev_y = self.x, self.y
+        self.move(self.x_speed * dt, self.y_speed * dt)
         # hp check moved to Enemy class
         # if self.hp <= 0:
         #    self.kill()
 
-    # draw hp bar
-    def draw_hp_bar(self, screen: pygame.Surface, x_offset=0):
-        pos = (self.x - x_offset, self.y - 15)
-        size = (self.width, 10)
-        pygame.draw.rect(screen, (0, 0, 0), (pos, size), 1)
-        bar_pos = (pos[0] + 3, pos[1] + 3)
-        bar_size = ((size[0] - 6) * (self.hp / self.max_hp), size[1] - 6)
-        pygame.draw.rect(screen, (0, 255, 0), (*bar_pos, *bar_size))
-
     # return whether or not a point is on the entity
     def lies_on(self, x, y):
         return (self.x <= x <= self.x + self.width and
@@ -0,0 +1,224 @@
+import argparse
+import sys
+import time
+
+import level as levels
+from enemy import MODES
+
+# numpy is required here, observations are numpy arrays
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# programmatic environment for aiming bots. GameEnv drives one headless Game
+# directly (no window, no event loop, no mouse): reset() starts a session,
+# step(action) shoots at an (x, y) or not and advances the game, and the
+# observation is numpy arrays of the enemies and crates. BatchEnv steps N
+# independent games in lockstep and returns everything stacked
+#
+#   env = GameEnv(seed=1)
+#   obs = env.reset()
+#   obs, reward, done, info = env.step((450, 300))
+#
+#   python3 env.py --envs 16 --steps 2000    measure env steps per second
+
+# columns of obs["enemies"], one row per enemy (mode is an index into
+# enemy.MODES, dead is 0 or 1)
+ENEMY_FEATURES = ["x", "y", "width", "height", "hp", "max_hp", "mode", "dead",
+    "x_speed", "y_speed", "distance"]
+# columns of obs["crates"]
+CRATE_FEATURES = ["x", "y", "width", "height"]
+
+MODE_INDEX = {mode: i for i, mode in enumerate(MODES)}
+
+class GameEnv:
+    def __init__(self, seed=None, level=None, enemy_store=False, max_enemies=64,
+            max_crates=32, ticks_per_step=1, max_ticks=60 * 60):
+        if np is None:
+            raise ImportError("the environment API requires numpy")
+
+        # the level is loaded once and shared by every session
+        if level is None or isinstance(level, str):
+            level = levels.load(level or levels.DEFAULT_LEVEL)
+        self.level = level
+        self.seed = seed
+        self.enemy_store = enemy_store
+        self.max_enemies = max_enemies # enemies beyond this are left out of obs
+        self.max_crates = max_crates
+        self.ticks_per_step = ticks_per_step
+        self.max_ticks = max_ticks # session length
+        self.game = None
+        self.ticks = 0
+
+    # start a new session, returns the first observation. without a seed
+    # sessions continue the seed sequence (seed, seed + 1, ...) or are random
+    def reset(self, seed=None):
+        self.start(seed)
+        return self.observe()
+
+    def start(self, seed=None):
+        # imported here, main.py brings up pygame
+        from main import Game
+
+        if seed is None and self.seed is not None:
+            seed = self.seed
+            self.seed += 1
+        self.game = Game(headless=True, seed=seed, enemy_store=self.enemy_store,
+            level=self.level)
+        self.ticks = 0
+
+    # shoot at action = (x, y) (None to hold fire) and advance ticks_per_step
+    # ticks. returns (observation, reward, done, info), the reward is the
+    # score gained
+    def step(self, action=None):
+        reward, done, info = self.advance(action)
+        return self.observe(), reward, done, info
+
+    # step() without the observation
+    def advance(self, action=None):
+        game = self.game
+        score = game.score
+        if action is not None:
+            game.mouse_pos = (int(action[0]), int(action[1]))
+            game.process_mouse_events()
+        for _ in range(self.ticks_per_step):
+            game.step()
+            game.timer.advance()
+        self.ticks += self.ticks_per_step
+        done = self.ticks >= self.max_ticks
+        info = {"score": game.score, "kills": game.kills, "shots": game.shots_fired}
+        return game.score - score, done, info
+
+    # {"enemies": (max_enemies, ENEMY_FEATURES), "enemy_mask": (max_enemies,),
+    # "crates": (max_crates, CRATE_FEATURES), "crate_mask": (max_crates,),
+    # "time": game time in ms}. rows past the mask are zero. out is a dict of
+    # arrays of those shapes to write into instead of new ones
+    def observe(self, out=None):
+        if out is None:
+            out = {
+                "enemies": np.zeros((self.max_enemies, len(ENEMY_FEATURES)), np.float32),
+                "enemy_mask": np.zeros(self.max_enemies, bool),
+                "crates": np.zeros((self.max_crates, len(CRATE_FEATURES)), np.float32),
+                "crate_mask": np.zeros(self.max_crates, bool),
+                "time": np.zeros((), np.float64),
+            }
+        game = self.game
+        n = observe_enemies(game, out["enemies"])
+        out["enemy_mask"][:n] = True
+        out["enemy_mask"][n:] = False
+
+        crates = [crate.rect for crate in game.crates][:self.max_crates]
+        out["crates"][:len(crates)] = [(r.x, r.y, r.width, r.height) for r in crates]
+        out["crates"][len(crates):] = 0
+        out["crate_mask"][:len(crates)] = True
+        out["crate_mask"][len(crates):] = False
+        out["time"][...] = game.timer.get_ticks()
+        return out
+
+# write a row of ENEMY_FEATURES per enemy into rows (zeroing the rest),
+# returns how many were written
+def observe_enemies(game, rows):
+    limit = len(rows)
+    store = game.enemy_store
+    if store is not None:
+        # straight from the store's arrays
+        slots = np.flatnonzero(store.alive[:store.size])[:limit]
+        n = len(slots)
+        for i, name in enumerate(ENEMY_FEATURES):
+            rows[:n, i] = getattr(store, name)[slots]
+    else:
+        data = [(e.x, e.y, e.width, e.height, e.hp, e.max_hp, MODE_INDEX[e.mode], e.dead,
+                e.x_speed, e.y_speed, e.distance)
+            for e, _ in zip(game.enemies, range(limit))]
+        n = len(data)
+        if n:
+            rows[:n] = data
+    rows[n:] = 0
+    return n
+
+# n GameEnvs stepped in lockstep. observations are stacked along a first
+# axis of size n, and a session that ends is reset right away (its final
+# observation is in info["final_observation"]). the arrays returned are
+# reused by the next step(), copy them to keep them
+class BatchEnv:
+    def __init__(self, n, seed=0, **kwargs):
+        if np is None:
+            raise ImportError("the environment API requires numpy")
+        # one shared level, every env gets its own seed sequence
+        level = kwargs.pop("level", None)
+        if level is None or isinstance(level, str):
+            level = levels.load(level or levels.DEFAULT_LEVEL)
+        self.envs = [GameEnv(seed=seed + i * 1000003, level=level, **kwargs) for i in range(n)]
+        env = self.envs[0]
+        self.obs = {
+            "enemies": np.zeros((n, env.max_enemies, len(ENEMY_FEATURES)), np.float32),
+            "enemy_mask": np.zeros((n, env.max_enemies), bool),
+            "crates": np.zeros((n, env.max_crates, len(CRATE_FEATURES)), np.float32),
+            "crate_mask": np.zeros((n, env.max_crates), bool),
+            "time": np.zeros(n, np.float64),
+        }
+        self.rewards = np.zeros(n, np.float64)
+        self.dones = np.zeros(n, bool)
+
+    def __len__(self):
+        return len(self.envs)
+
+    # views of self.obs for env i
+    def env_obs(self, i):
+        return {name: values[i, ...] for name, values in self.obs.items()}
+
+    def reset(self):
+        for i, env in enumerate(self.envs):
+            env.start()
+            env.observe(self.env_obs(i))
+        return self.obs
+
+    # actions is an (n, 3) array of (fire, x, y) rows, or a list of
+    # (x, y) / None. returns stacked (observations, rewards, dones, infos)
+    def step(self, actions):
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            if action is not None and len(action) == 3:
+                action = action[1:] if action[0] else None
+            reward, done, info = env.advance(action)
+            self.rewards[i] = reward
+            self.dones[i] = done
+            if done:
+                info["final_observation"] = env.observe()
+                env.start()
+            env.observe(self.env_obs(i))
+            infos.append(info)
+        return self.obs, self.rewards, self.dones, infos
+
+# steps per second of a BatchEnv shooting at random points
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PooperHunt environment throughput")
+    parser.add_argument("--envs", type=int, default=16)
+    parser.add_argument("--steps", type=int, default=2000, help="batch steps to time")
+    parser.add_argument("--fire-rate", type=float, default=0.1,
+        help="chance that an env shoots on a step")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--enemy-store", action="store_true",
+        help="run with the numpy struct-of-arrays enemy store")
+    parser.add_argument("--level", metavar="PATH", default=levels.DEFAULT_LEVEL)
+    args = parser.parse_args(argv)
+
+    batch = BatchEnv(args.envs, seed=args.seed, enemy_store=args.enemy_store, level=args.level)
+    batch.reset()
+    rng = np.random.default_rng(args.seed)
+    actions = np.zeros((args.envs, 3), np.int64)
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        actions[:, 0] = rng.random(args.envs) < args.fire_rate
+        actions[:, 1] = rng.integers(0, 900, args.envs)
+        actions[:, 2] = rng.integers(0, 600, args.envs)
+        batch.step(actions)
+    elapsed = time.perf_counter() - start
+
+    steps = args.steps * args.envs
+    print(f"{steps} env steps in {elapsed:.2f} s: {steps / elapsed:.0f} steps/s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
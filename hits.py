@@ -0,0 +1,91 @@
+# numpy is optional, only needed when Game(enemy_store=True)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# result of resolving a frame's shots against the enemy store
+class HitResult:
+    def __init__(self, hp, score, events):
+        self.hp = hp # enemy hp after every bullet was applied (store rows)
+        self.score = score # score added by all shots together
+        # (bullet index, store slot, damage, used aoe damage, score added
+        # if the hit killed the enemy else 0) in the order the scalar path
+        # would have applied them: shot by shot, nearest enemy first
+        self.events = events
+
+# resolve every shot (a Bullet) against every enemy of an EnemyStore at once.
+# this is Game.fire() / Bullet.raycast() / find_dmg_multiplier() /
+# find_aoe_dmg_multiplier() done as one (shots x enemies) array pass.
+# blocked_at is each shot's Bullet.crate_depth(). shots are applied in list
+# order so kills and the multi-kill score doubling come out the same as
+# firing them one at a time
+def resolve_hits(bullets, blocked_at, store, max_distance):
+    n = store.size
+    b = len(bullets)
+    if b == 0 or n == 0:
+        return HitResult(store.hp[:n].copy(), 0, [])
+
+    # bullets as column vectors (b, 1), enemies as row vectors (n,)
+    bx = np.array([bullet.x for bullet in bullets], dtype="f8")[:, None]
+    by = np.array([bullet.y for bullet in bullets], dtype="f8")[:, None]
+    blocked = np.array(blocked_at, dtype="f8")[:, None]
+    damage = np.array([bullet.damage for bullet in bullets], dtype="f8")[:, None]
+    aoe_damage = np.array([bullet.aoe_damage for bullet in bullets], dtype="f8")[:, None]
+    aoe_range = np.array([bullet.aoe_range for bullet in bullets], dtype="f8")[:, None]
+    dropoff = np.array([bullet.apply_aoe_dropoff for bullet in bullets], dtype="?")[:, None]
+
+    x, y = store.x[:n], store.y[:n]
+    w, h = store.width[:n], store.height[:n]
+    # centers the same way pygame.Rect computes them
+    cx = np.trunc(x) + w // 2
+    cy = np.trunc(y) + h // 2
+
+    # distance from every bullet to every enemy center
+    dist = np.sqrt((cx - bx)**2 + (cy - by)**2)
+
+    # hit test (in front of the crate the shot stops at, then point-in-box
+    # or aoe radius)
+    depth = store.distance[:n]
+    in_box = (x <= bx) & (bx <= x + w) & (y <= by) & (by <= y + h)
+    hit = store.alive[:n] & (depth < blocked) & (depth <= max_distance)
+    hit &= np.where(aoe_range <= 0, in_box, dist <= aoe_range)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # direct damage falls off from the center to the edge
+        radius = cx - x
+        direct = np.where(radius != 0, (radius - dist) / radius, 0)
+        direct = damage * np.maximum(0, direct)
+
+        # aoe damage falls off from the bullet to the edge of the aoe
+        aoe = np.where(aoe_range != 0, (aoe_range - dist) / aoe_range, 0)
+        aoe = np.where(dropoff, aoe, 1)
+        aoe = np.where(dist > aoe_range, 0, np.maximum(0, aoe))
+        aoe = aoe_damage * aoe
+
+    applied = np.where(hit, np.maximum(direct, aoe), 0)
+
+    # hp after each bullet, subtracted in order like the scalar path
+    hp_after = np.subtract.accumulate(
+        np.vstack([store.hp[:n][None, :], applied]), axis=0)[1:]
+    killed = hit & (hp_after <= 0)
+
+    # score doubles for each enemy killed by the same bullet
+    kills = killed.sum(axis=1)
+    score = int(sum(100 * 2**(int(k) - 1) for k in kills if k))
+
+    events = []
+    used_aoe = direct < aoe
+    for bullet_i in np.flatnonzero(hit.any(axis=1)):
+        slots = np.flatnonzero(hit[bullet_i])
+        kill_n = 0
+        for slot in slots[np.argsort(depth[slots], kind="stable")]:
+            if killed[bullet_i, slot]:
+                kill_n += 1
+                score_added = 100 * 2**(kill_n - 1)
+            else:
+                score_added = 0
+            events.append((int(bullet_i), int(slot), float(applied[bullet_i, slot]),
+                bool(used_aoe[bullet_i, slot]), score_added))
+
+    return HitResult(hp_after[-1], score, events)
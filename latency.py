@@ -0,0 +1,119 @@
+import collections
+import csv
+import json
+import time
+from array import array
+
+# per-click input latency (python3 main.py --latency PATH). every click is
+# stamped three times:
+#
+#   event      when it happened. pygame 2 events carry no timestamp, so it is
+#              the time the event was pumped out of the queue
+#   resolve    when its shot was resolved (Game.process_mouse_events(), on
+#              the simulation thread with --threaded)
+#   present    when the first frame drawn after that was flipped
+#
+# the time from event to resolve and from event to present goes into
+# histograms of bin_ms wide bins (the last bin also counts everything
+# slower), so a long session costs no memory growth
+
+STAGES = ["resolve", "present"]
+
+class LatencyTracker:
+    def __init__(self, bin_ms=1, bins=250):
+        self.bin_ms = bin_ms
+        self.bins = bins
+        # [event, resolve] perf_counter() times of clicks waiting for their
+        # shot. appended by the event thread, popped by the simulation
+        self.pending = collections.deque()
+        # resolved clicks waiting to be presented, popped by the thread that
+        # flips the frames
+        self.resolved = collections.deque()
+        self.resolve_count = 0 # clicks resolved so far
+        self.histograms = {stage: array("L", bytes(array("L").itemsize * bins))
+            for stage in STAGES}
+        self.total_ms = dict.fromkeys(STAGES, 0.0)
+        self.max_ms = dict.fromkeys(STAGES, 0.0)
+        self.clicks = 0 # clicks presented so far
+
+    # a click event happened at event_time (perf_counter() seconds)
+    def click(self, event_time):
+        self.pending.append([event_time, None])
+
+    # the oldest pending click's shot was just resolved
+    def resolve(self):
+        if not self.pending:
+            return # a scripted click, not one from an event
+        click = self.pending.popleft()
+        click[1] = time.perf_counter()
+        self.resolved.append(click)
+        self.resolve_count += 1
+
+    # a frame drawn when resolve_count was resolved was just flipped. the
+    # count is cumulative, so clicks in a frame that was dropped (see
+    # pipeline.FrameBuffer) are presented with the next one
+    def presented(self, resolved):
+        if self.clicks >= resolved:
+            return
+        now = time.perf_counter()
+        while self.clicks < resolved:
+            event, resolve = self.resolved.popleft()
+            self.add("resolve", (resolve - event) * 1000)
+            self.add("present", (now - event) * 1000)
+            self.clicks += 1
+
+    def add(self, stage, ms):
+        ms = max(ms, 0)
+        self.histograms[stage][min(int(ms / self.bin_ms), self.bins - 1)] += 1
+        self.total_ms[stage] += ms
+        self.max_ms[stage] = max(self.max_ms[stage], ms)
+
+    # percentiles of a stage, read off its histogram (upper bin edges)
+    def percentile(self, stage, q):
+        counts = self.histograms[stage]
+        target = q * self.clicks
+        seen = 0
+        for i, count in enumerate(counts):
+            seen += count
+            if seen >= target and seen:
+                return min((i + 1) * self.bin_ms, self.max_ms[stage])
+        return 0
+
+    def summary(self):
+        res = {"clicks": self.clicks}
+        for stage in STAGES:
+            res[stage + "_ms"] = {
+                "mean": self.total_ms[stage] / self.clicks if self.clicks else 0,
+                "p50": self.percentile(stage, 0.50),
+                "p95": self.percentile(stage, 0.95),
+                "p99": self.percentile(stage, 0.99),
+                "max": self.max_ms[stage],
+            }
+        return res
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"Clicks: {summary['clicks']}")
+        for stage in STAGES:
+            stats = summary[stage + "_ms"]
+            print(f"Click to {stage}: mean {stats['mean']:.1f} p50 {stats['p50']:.1f} "
+                f"p95 {stats['p95']:.1f} p99 {stats['p99']:.1f} max {stats['max']:.1f} ms")
+
+    # write the histograms as csv (one row per bin) or json with the
+    # session's score and the summary, depending on the file extension
+    def dump(self, path, score):
+        rows = [(i * self.bin_ms,) + tuple(self.histograms[stage][i] for stage in STAGES)
+            for i in range(self.bins)]
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["bin_ms"] + [stage + "_count" for stage in STAGES])
+                writer.writerows(rows)
+        else:
+            with open(path, "w") as f:
+                json.dump({
+                    "score": score,
+                    "summary": self.summary(),
+                    "bin_ms": self.bin_ms,
+                    "histograms": {stage: list(self.histograms[stage]) for stage in STAGES},
+                }, f)
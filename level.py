@@ -0,0 +1,152 @@
+import hashlib
+import heapq
+import itertools
+import json
+import os
+
+# level files. a level is a json file with the crates, the spawn points and
+# the waves of the level:
+#
+#   {
+#       "size": [width, height],
+#       "crates": [[x, y, width, height], ...],
+#       "spawns": [
+#           {"pos": [x, y], "every": [min ms, max ms], "start": ms, "stop": ms},
+#           ...
+#       ],
+#       "waves": [
+#           {"at": ms, "spawn": spawn index, "count": n, "interval": ms},
+#           ...
+#       ]
+#   }
+#
+# size is the size of the world, 900x600 (the view) by default. a larger
+# world scrolls (see camera.py)
+#
+# crates are optional. on a level without any, hurt enemies have nowhere to
+# hide and keep wandering
+#
+# a spawn point with "every" spawns an enemy at "start" (default 0) and then
+# again after a random min-max ms each time, until "stop" (default never).
+# without it the spawn point is only used by waves. a wave spawns count
+# enemies at a spawn point, interval ms apart, starting at "at"
+#
+# the game compiles a level once: crates go into the crate spatial index and
+# every spawn time into one SpawnQueue, so a frame only looks at the spawns
+# that are due
+
+LEVEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "levels")
+DEFAULT_LEVEL = os.path.join(LEVEL_DIR, "default.json")
+DEFAULT_SIZE = (900, 600)
+
+class SpawnPoint:
+    def __init__(self, pos, every=None, start=0, stop=None):
+        self.x, self.y = pos
+        self.every = every # (min ms, max ms) between spawns, None = waves only
+        self.start = start
+        self.stop = stop
+
+class Wave:
+    def __init__(self, at, spawn, count=1, interval=0):
+        self.at = at
+        self.spawn = spawn # index into Level.spawns
+        self.count = count
+        self.interval = interval
+
+class Level:
+    def __init__(self, crates, spawns, waves, size=DEFAULT_SIZE):
+        self.crates = crates # [(x, y, width, height)]
+        self.spawns = spawns # [SpawnPoint]
+        self.waves = waves # [Wave]
+        self.width, self.height = size # world size
+        self.path = None # the file it was loaded from, if any
+
+def load(path=DEFAULT_LEVEL):
+    with open(path) as f:
+        data = json.load(f)
+    try:
+        level = parse(data)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"{path} is not a valid level: {e!r}") from None
+    level.path = os.path.abspath(path)
+    return level
+
+# hash of everything in a level that the simulation reads, so a recording
+# can tell whether it is replayed on the level it was recorded on (also
+# after the level was changed in code, like montecarlo.py does)
+def digest(level):
+    content = [
+        [level.width, level.height],
+        level.crates,
+        [[spawn.x, spawn.y, spawn.every, spawn.start, spawn.stop] for spawn in level.spawns],
+        [[wave.at, wave.spawn, wave.count, wave.interval] for wave in level.waves],
+    ]
+    return hashlib.blake2b(json.dumps(content).encode(), digest_size=16).digest()
+
+def parse(data):
+    size = tuple(data.get("size", DEFAULT_SIZE))
+    if len(size) != 2 or not (size[0] > 0 and size[1] > 0):
+        raise ValueError(f"size {list(size)} is not [width, height]")
+
+    crates = [tuple(crate) for crate in data.get("crates", [])]
+    for crate in crates:
+        if len(crate) != 4:
+            raise ValueError(f"crate {list(crate)} is not [x, y, width, height]")
+
+    spawns = []
+    for spawn in data.get("spawns", []):
+        every = spawn.get("every")
+        if every is not None:
+            every = tuple(every)
+            if len(every) != 2 or not 0 < every[0] <= every[1]:
+                raise ValueError(f"spawn every {list(every)} is not [min ms, max ms]")
+        spawns.append(SpawnPoint(tuple(spawn["pos"]), every,
+            spawn.get("start", 0), spawn.get("stop")))
+
+    waves = []
+    for wave in data.get("waves", []):
+        if not 0 <= wave["spawn"] < len(spawns):
+            raise ValueError(f"wave spawn {wave['spawn']} is not a spawn point index")
+        waves.append(Wave(wave["at"], wave["spawn"],
+            wave.get("count", 1), wave.get("interval", 0)))
+
+    return Level(crates, spawns, waves, size)
+
+# min-heap of upcoming (time, seq, spawn point, repeating) spawns
+class SpawnQueue:
+    def __init__(self, level, rng):
+        self.level = level
+        self.rng = rng
+        self.events = []
+        self.counter = itertools.count()
+        for i, spawn in enumerate(level.spawns):
+            if spawn.every is not None:
+                self.push(spawn.start, i, True)
+        for wave in level.waves:
+            for n in range(wave.count):
+                self.push(wave.at + n * wave.interval, wave.spawn, False)
+
+    def __len__(self):
+        return len(self.events)
+
+    def push(self, time, spawn_i, repeat):
+        heapq.heappush(self.events, (time, next(self.counter), spawn_i, repeat))
+
+    def clear(self):
+        self.events.clear()
+
+    # (x, y) of every spawn due at current_time. a repeating spawn point
+    # schedules its next spawn a random interval after current_time
+    def due(self, current_time):
+        events = self.events
+        res = []
+        while events and events[0][0] <= current_time:
+            _, _, spawn_i, repeat = heapq.heappop(events)
+            spawn = self.level.spawns[spawn_i]
+            res.append((spawn.x, spawn.y))
+            if repeat:
+                low, high = spawn.every
+                next_time = current_time + self.rng.randint(low, high)
+                if spawn.stop is None or next_time <= spawn.stop:
+                    self.push(next_time, spawn_i, True)
+        return res
@@ -1,234 +1,880 @@
+import startup
+if __name__ == "__main__":
+    startup.report.begin()
+
 import pygame
 import random
-from utils import get_image, find_damage_multiplier
-from enemy import Enemy
+import os
+import argparse
+import time
+from utils import get_image, find_damage_multiplier, render_text, get_font
+from enemy import Enemy, update_at_rate
 from bullet import Bullet
 from props import Crate, PopupText
-
-pygame.init()
-pygame.font.init()
-
-ENEMY_STATE_CHANGE = pygame.USEREVENT + 1
-
-# crate locations (x, y, width, height)
-CRATES = [
-    (100, 400, 100, 100),
-    (600, 300, 100, 100)
-]
-
-heading_font = pygame.font.Font("assets/VT323.ttf", 48)
-small_font = pygame.font.Font("assets/VT323.ttf", 24)
-
-class Spawn:
-    def __init__(self, spawn, frequency=range(5000, 10000)):
-        self.x, self.y = spawn
-        self.min = min(frequency)
-        self.max = max(frequency)
-        self.last_spawn = -float('inf')
-        self.next_enemy = random.randint(self.min, self.max)
-
-    def update(self):
-        current_time = pygame.time.get_ticks()
-
-        # indicate that an enemy should be spawned
-        if current_time - self.last_spawn >= self.next_enemy:
-            self.next_enemy = random.randint(self.min, self.max)
-            self.last_spawn = current_time
-            return True
-
-        return False
+from timing import FixedTimer, tick_dt
+from spatial import SpatialHash
+from hits import resolve_hits
+from scheduler import ActionScheduler
+from cover import CoverIndex
+from render import RenderBatch, StaticLayer
+from camera import Camera
+from latency import LatencyTracker
+from pool import Pool
+import atlas
+import sprites
+import level as levels
+
+# (font, size) for utils.get_font(), loaded when first drawn
+HEADING_FONT = ("VT323.ttf", 48)
+SMALL_FONT = ("VT323.ttf", 24)
 
 class Game:
-    def __init__(self, fps=60):
+    def __init__(self, fps=60, headless=False, timer=None, enemy_store=False,
+            dirty_rects=False, seed=None, tick_rate=60, level=None, threaded=False,
+            low_latency=False):
+        # the simulation always advances in fixed ticks of 1/tick_rate
+        # seconds of game time, fps only caps how often frames are drawn.
+        # headless mode runs the simulation on the SDL dummy driver with no
+        # drawing and no frame cap
+        self.headless = headless
+        with startup.report.step("display init"):
+            init_display(headless)
+        # read the mouse every frame (off when it is scripted or replayed)
+        self.live_input = not headless
+        # simulate on a separate thread from drawing (see pipeline.py)
+        self.threaded = threaded
+        self.simulation = None # pipeline.SimulationThread while it runs
+        # aim clicks where the cursor was when clicked, poll input again
+        # right before drawing and wait for frames in a busy loop (see loop())
+        self.low_latency = low_latency
+
+        # every random decision in the game comes from this rng, so a seed
+        # (plus the recorded input) reproduces a whole session
+        if seed is None:
+            seed = random.randrange(2**32)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.recorder = None # replay.Recorder capturing input, if recording
+        self.profiler = None # profiler.FrameProfiler timing each frame's phases
+        self.latency = None # latency.LatencyTracker timing each click
+
         # initialize window
         self.canvas_width, self.canvas_height = 900, 700
         self.width, self.height = 900, 600
-        self.screen = pygame.display.set_mode((self.canvas_width, self.canvas_height), flags=pygame.SCALED)
-        pygame.display.set_caption("PooperHunt")
-        pygame.mouse.set_visible(False)
+        with startup.report.step("set display mode"):
+            if headless:
+                # a display mode is still needed for convert_alpha() in get_image
+                if pygame.display.get_surface() is None:
+                    pygame.display.set_mode((1, 1))
+                self.screen = pygame.Surface((self.canvas_width, self.canvas_height))
+            else:
+                self.screen = pygame.display.set_mode((self.canvas_width, self.canvas_height), flags=pygame.SCALED)
+                pygame.display.set_caption("PooperHunt")
+                pygame.mouse.set_visible(False)
+
+        # dirty rectangle rendering: only the areas that changed since the
+        # last frame are restored from the backdrop, redrawn and presented
+        self.dirty_rects = dirty_rects
+        self.backdrop = pygame.Surface((self.canvas_width, self.canvas_height))
+        self.backdrop.fill((255, 255, 255))
+        self.last_drawn = None # areas drawn over last frame, None = full redraw
+        # sprites, crates, popups and the scope are queued here and blitted together
+        self.batch = RenderBatch()
 
         # initialize assets
-        self.background = get_image("background.png", self.width, self.height)
-        self.ammo_icon = get_image("ammo.png", 50, 50)
-        self.scope = get_image("scope.png", 100, 100)
+        with startup.report.step("load atlas"):
+            atlas.load()
+        with startup.report.step("load images"):
+            self.background = get_image("background.png", self.width, self.height)
+            self.ammo_icon = get_image("ammo.png", 50, 50)
+            self.scope = get_image("scope.png", 100, 100)
+            sprites.resolve_all()
 
         # initialize game states and stuff
         self.frame_cap = fps
+        self.tick_rate = tick_rate
         self.clock = pygame.time.Clock()
-        pygame.time.set_timer(ENEMY_STATE_CHANGE, 1000)
+        # game time, advanced by one tick per step()
+        if timer is None:
+            timer = FixedTimer(1000 / tick_rate)
+        self.timer = timer
+        self.dt = tick_dt(1000 / tick_rate) # see timing.REFERENCE_STEP
+        # real time not yet simulated (see loop())
+        self.lag = 0
+        self.max_ticks_per_frame = 5 # beyond this the game slows down instead
+        # enemy states are changed every second of game time in step()
+        self.next_state_change = self.timer.get_ticks() + 1000
         self.stopped = False
         self.score = 0
+        self.mouse_pos = (0, 0) # in the world, see camera.py
+        self.tick = 0 # ticks simulated so far
+
+        # the level (a level.Level or a level file path) sets the size of the
+        # world, self.width x self.height is the part of it in view
+        if level is None or isinstance(level, str):
+            with startup.report.step("load level"):
+                level = levels.load(level or levels.DEFAULT_LEVEL)
+        self.level = level
+        self.world_width, self.world_height = level.width, level.height
+        self.camera = Camera(self.world_width, self.world_height, self.width, self.height)
+        self.scroll_dir = (0, 0) # held scroll keys, see step()
+        self.scroll_speed = 12 # pixels per timing.REFERENCE_STEP
+        # enemies further than sim_radius from the view are updated only
+        # every far_update_every ticks (see enemy.update_at_rate())
+        self.sim_radius = 600
+        self.far_update_every = 4
+        self.spawned = 0
 
         # create entity groups
         self.enemies = pygame.sprite.Group()
         self.crates = pygame.sprite.Group()
+        # the crates, pre-rendered in chunks for drawing
+        self.static_layer = StaticLayer()
         self.popup_text = pygame.sprite.Group()
-        self.spawns = []
-        self.bullets = []
+        # spatial indexes used for collision queries
+        self.crate_index = SpatialHash()
+        # nearest crate lookup for panicking enemies, passed to their updates
+        self.cover = CoverIndex(self.crate_index, self.world_width, self.world_height)
+        self.enemy_index = SpatialHash()
+        # starts/ends every enemy's scheduled actions
+        self.scheduler = ActionScheduler()
+        # optional numpy-backed enemy storage (see enemy_store.py), enemies
+        # in the store are hit-tested against its arrays instead of enemy_index
+        self.enemy_store = None
+        if enemy_store:
+            from enemy_store import EnemyStore
+            self.enemy_store = EnemyStore(rng=self.rng)
+        # killed enemies and fired bullets are reused instead of reallocated
+        if self.enemy_store is not None:
+            from enemy_store import StoredEnemy
+            self.enemy_pool = Pool(lambda *args, **kwargs:
+                StoredEnemy(self.enemy_store, *args, **kwargs))
+        else:
+            self.enemy_pool = Pool(Enemy)
+        self.bullet_pool = Pool(Bullet)
+        # what spawn_enemy() and shoot() create (tuned by montecarlo.py)
+        self.enemy_stats = dict(
+            size=(50, 50),
+            distance=100,
+            hp=100,
+            x_speed=2,
+            y_speed=0,
+            panic_multiplier=2)
+        self.shot_stats = dict(
+            dmg=120,
+            aoe_dmg=0,
+            aoe_range=0,
+            apply_aoe_dropoff=False)
+        # shots fired, enemies killed (as scored, see apply_hits()) and
+        # {enemies killed by one shot: shots} for shots that killed any
+        self.shots_fired = 0
+        self.kills = 0
+        self.multi_kills = {}
+        # shots fired but not resolved yet, with the enemy store they are
+        # resolved together (see resolve_shots())
+        self.shots = []
+        self.unresolved_clicks = 0 # clicks whose shots are in self.shots
         self.MAX_DISTANCE = 1000
-        self.spawns.append(Spawn((450, 300), range(500, 2000)))
-        for crate in CRATES:
-            x, y, w, h = crate
-            self.crates.add(Crate((x, y), (w, h)))
+
+        # the level is compiled once: crates into crate_index, spawn times
+        # into one queue
+        for x, y, w, h in level.crates:
+            self.add_crate((x, y), (w, h))
+        self.spawn_queue = levels.SpawnQueue(level, self.rng)
 
     def process_events(self):
+        pumped = time.perf_counter() # when the events below left the queue
         keys = pygame.key.get_pressed()
-        
+        if not self.camera.fixed:
+            self.set_scroll(
+                (keys[pygame.K_RIGHT] or keys[pygame.K_d]) - (keys[pygame.K_LEFT] or keys[pygame.K_a]),
+                (keys[pygame.K_DOWN] or keys[pygame.K_s]) - (keys[pygame.K_UP] or keys[pygame.K_w]))
+
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 self.stopped = True
                 return
-            # 1 second game timer for updating enemy states
-            elif event.type == ENEMY_STATE_CHANGE:
-                for enemy in self.enemies:
-                    if random.random() < 0.25:
-                        enemy.change_dir()
             # mouse click
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                self.process_mouse_events()
+                # the hud below a scrolling view is not part of the world
+                if not self.camera.fixed and event.pos[1] > self.height:
+                    continue
+                if self.latency is not None:
+                    self.latency.click(pumped)
+                if self.simulation is not None:
+                    self.simulation.send("click", event.pos)
+                else:
+                    if self.low_latency:
+                        # the cursor at the click, not at the last tick
+                        self.mouse_pos = self.camera.to_world(event.pos)
+                    self.process_mouse_events()
+            # toggle the profiler overlay
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                if self.profiler is not None:
+                    self.profiler.overlay = not self.profiler.overlay
+        # the clicks of this frame hit together
+        if self.simulation is None:
+            self.resolve_shots()
+
+    # scroll the camera in direction (dx, dy) from the next tick on
+    def set_scroll(self, dx, dy):
+        if (dx, dy) == self.scroll_dir:
+            return
+        if self.simulation is not None:
+            self.simulation.send("scroll", (dx, dy))
+        else:
+            self.scroll_dir = (dx, dy)
+
+    # randomly turn enemies around (ran once per second)
+    def change_enemy_states(self):
+        if self.recorder is not None:
+            self.recorder.state_change()
+        if self.enemy_store is not None:
+            self.enemy_store.change_dirs(0.25)
+            return
+        for enemy in self.enemies:
+            if self.rng.random() < 0.25:
+                enemy.change_dir()
 
     # ran when a mouse click is detected
     def process_mouse_events(self):
-        current_time = pygame.time.get_ticks()
+        if self.recorder is not None:
+            self.recorder.click(self.mouse_pos)
         mousex, mousey = self.mouse_pos
         # change bounds if a left menu is added (canvas x-y offset or something)
-        if mousex <= self.width and mousey <= self.height:
+        if mousex <= self.world_width and mousey <= self.world_height:
             self.shoot(mousex, mousey)
-
-    # update entity groups
-    def update(self):
-        current_time = pygame.time.get_ticks()
-        self.mouse_pos = pygame.mouse.get_pos()
-
-        # draw + update enemies, + kill them if out of screen
-        self.enemies.update(self.crates)
+        self.unresolved_clicks += 1
+
+    # advance the simulation by one tick (no drawing)
+    def step(self):
+        current_time = self.timer.get_ticks()
+        profiler = self.profiler
+        # shots fired since the last tick (by bots or scripts, clicks are
+        # resolved as soon as their frame's events are handled)
+        self.resolve_shots()
+        if profiler is not None:
+            profiler.mark("shots")
+        if current_time >= self.next_state_change:
+            self.change_enemy_states()
+            self.next_state_change += 1000
+        if self.scroll_dir != (0, 0):
+            self.scroll_camera()
+        if self.live_input:
+            self.mouse_pos = self.camera.to_world(pygame.mouse.get_pos())
+        if self.recorder is not None:
+            self.recorder.frame(current_time, self.mouse_pos)
+        self.tick += 1
+
+        self.update_enemies(current_time)
+        if profiler is not None:
+            profiler.mark("enemies")
+        self.update_popups(current_time)
+        if profiler is not None:
+            profiler.mark("popups")
+        self.update_spawns(current_time)
+        if profiler is not None:
+            profiler.mark("spawns")
+
+    # move the camera by scroll_dir for one tick
+    def scroll_camera(self):
+        camera = self.camera
+        old = (camera.x, camera.y)
+        dx, dy = self.scroll_dir
+        speed = self.scroll_speed * self.dt
+        camera.scroll(dx * speed, dy * speed)
+        if self.recorder is not None and (camera.x, camera.y) != old:
+            self.recorder.camera((camera.x, camera.y))
+
+    # the part of the world (x0, y0, x1, y1) simulated every tick: the view
+    # and sim_radius around it. None if that is the whole world
+    def near_view(self):
+        view = self.camera.view()
+        r = self.sim_radius
+        near = (view.left - r, view.top - r, view.right + r, view.bottom + r)
+        if near[0] <= 0 and near[1] <= 0 and \
+                near[2] >= self.world_width and near[3] >= self.world_height:
+            return None
+        return near
+
+    # update enemies, + kill them if out of the world (walked off the sides
+    # or, once dead, fell through the bottom)
+    def update_enemies(self, current_time):
+        self.scheduler.advance(current_time)
+        near = self.near_view()
+        if self.enemy_store is not None:
+            killed = self.enemy_store.update(self.cover, current_time,
+                self.world_width, self.world_height, self.dt,
+                near, self.far_update_every, self.tick)
+            self.enemy_pool.release_all(killed)
+            return
+        if near is None:
+            self.enemies.update(self.cover, current_time, self.dt)
+        else:
+            for enemy in self.enemies:
+                update_at_rate(enemy, self.cover, current_time, self.dt,
+                    near, self.far_update_every, self.tick)
         for enemy in self.enemies:
-            enemy.draw(self.screen)
-            if enemy.x + enemy.width < 0 or enemy.x > self.width:
+            if enemy.x + enemy.width < 0 or enemy.x > self.world_width or \
+                    enemy.y > self.world_height:
                 enemy.kill()
+                self.enemy_pool.release(enemy)
 
-        self.crates.draw(self.screen)
-
-        self.popup_text.update()
+    # move hitmarkers and remove the expired ones
+    def update_popups(self, current_time):
+        self.popup_text.update(self.dt)
         for popuptext in self.popup_text:
             if current_time >= popuptext.destroy:
                 popuptext.kill()
-            else:
-                popuptext.draw(self.screen)
-        
-        # update bullets
-        for bullet in self.bullets:
-            bullet.move()
-
-            # check if bullet is too far away or if it has hit a crate
-            if bullet.distance > self.MAX_DISTANCE or \
-                    bullet.check_for_hit(self.crates, check_aoe=False):
-                self.bullets.remove(bullet)
-                continue
 
-            # check if an enemy is hit by bullet
-            hits = bullet.check_for_hit(self.enemies)
-            if hits:
-                self.bullets.remove(bullet)
-                score_added = 0
-                for hit in hits:
-                    # find direct damage
-                    dmg_multiplier = Bullet.find_dmg_multiplier(hit, bullet)
-                    direct_damage = bullet.damage * dmg_multiplier
-
-                    # find aoe damage
-                    dmg_multiplier = Bullet.find_aoe_dmg_multiplier(hit, bullet)
-                    aoe_damage = bullet.aoe_damage * dmg_multiplier
-
-                    # apply the larger damage
-                    damage = max(direct_damage, aoe_damage)
-                    hit.hp -= damage
-
-                    # find hitmarker position
-                    if direct_damage < aoe_damage: # if using aoe damage
-                        dmg_x, dmg_y = hit.rect.center
-                    else:
-                        dmg_x, dmg_y = bullet.x, bullet.y
-                    offset_x = random.randint(-20, 10)
-                    offset_y = random.randint(-20, 10)
-
-                    # draw hitmarker
-                    new_hitmarker = PopupText(
-                        text=str(int(damage)),
-                        spawn=(dmg_x + offset_x, dmg_y + offset_y),
-                        font=small_font,
-                        color=(0, 0, 255),
-                        destroy=current_time + 200)
-                    self.popup_text.add(new_hitmarker)
-                    new_hitmarker.x_speed = random.random() * 2 - 1
-                    new_hitmarker.y_speed = random.random() * -1
-
-                    # multiply score by 2 for each enemy killed with 1 bullet
-                    if hit.hp <= 0:
-                        score_added = max(score_added * 2, 100)
-                        new_hitmarker = PopupText(
-                            text="+" + str(score_added),
-                            spawn=(dmg_x, dmg_y),
-                            font=small_font,
-                            color=(205, 205, 0),
-                            destroy=current_time + 400)
-                        self.popup_text.add(new_hitmarker)
-                        new_hitmarker.y_speed = -2
-
-                # add score
-                self.score += score_added
-
-        # update spawns
-        for spawn in self.spawns:
-            spawner_state = spawn.update()
-            # spawn a new enemy (timer is in Spawn class)
-            if spawner_state:
-                new_enemy = Enemy(
-                    spawn=(spawn.x, spawn.y), 
-                    size=(50, 50), 
-                    distance=100, 
-                    hp=100, 
-                    x_speed=2, 
-                    y_speed=0)
-                self.enemies.add(new_enemy)
+    # damage the enemies hit by a bullet and add the score
+    def apply_hits(self, bullet, hits, current_time):
+        score_added = 0
+        kills = 0
+        for hit in hits:
+            # find direct damage
+            dmg_multiplier = Bullet.find_dmg_multiplier(hit, bullet)
+            direct_damage = bullet.damage * dmg_multiplier
+
+            # find aoe damage
+            dmg_multiplier = Bullet.find_aoe_dmg_multiplier(hit, bullet)
+            aoe_damage = bullet.aoe_damage * dmg_multiplier
+
+            # apply the larger damage
+            damage = max(direct_damage, aoe_damage)
+            hit.hp -= damage
+
+            # multiply score by 2 for each enemy killed with 1 bullet
+            killed = hit.hp <= 0
+            if killed:
+                score_added = max(score_added * 2, 100)
+                kills += 1
+
+            self.show_hit(bullet, hit, damage, direct_damage < aoe_damage,
+                score_added if killed else 0, current_time)
+
+        # add score
+        self.score += score_added
+        self.count_kills(kills)
+
+    def count_kills(self, kills):
+        if kills:
+            self.kills += kills
+            self.multi_kills[kills] = self.multi_kills.get(kills, 0) + 1
+
+    # spawn the hitmarker popups for a bullet hitting an enemy
+    def show_hit(self, bullet, hit, damage, used_aoe, score_added, current_time):
+        # find hitmarker position
+        if used_aoe: # if using aoe damage
+            dmg_x, dmg_y = hit.rect.center
+        else:
+            dmg_x, dmg_y = bullet.x, bullet.y
+        offset_x = self.rng.randint(-20, 10)
+        offset_y = self.rng.randint(-20, 10)
+
+        # draw hitmarker
+        new_hitmarker = PopupText(
+            text=str(int(damage)),
+            spawn=(dmg_x + offset_x, dmg_y + offset_y),
+            font=SMALL_FONT,
+            color=(0, 0, 255),
+            destroy=current_time + 200)
+        self.popup_text.add(new_hitmarker)
+        new_hitmarker.x_speed = self.rng.random() * 2 - 1
+        new_hitmarker.y_speed = self.rng.random() * -1
+
+        # show the score added if the enemy was killed
+        if score_added:
+            new_hitmarker = PopupText(
+                text="+" + str(score_added),
+                spawn=(dmg_x, dmg_y),
+                font=SMALL_FONT,
+                color=(205, 205, 0),
+                destroy=current_time + 400)
+            self.popup_text.add(new_hitmarker)
+            new_hitmarker.y_speed = -2
+
+    # spawn the enemies that are due
+    def update_spawns(self, current_time):
+        queue = self.spawn_queue
+        if not queue.events or queue.events[0][0] > current_time:
+            return
+        for pos in queue.due(current_time):
+            self.spawn_enemy(pos)
+
+    # add a new angry pooper at pos
+    def spawn_enemy(self, pos):
+        stats = dict(
+            spawn=pos,
+            scheduler=self.scheduler,
+            rng=self.rng,
+            **self.enemy_stats)
+        new_enemy = self.enemy_pool.acquire(**stats)
+        new_enemy.sim_phase = self.spawned
+        self.spawned += 1
+        self.enemies.add(new_enemy)
+        if self.enemy_store is None:
+            self.enemy_index.insert(new_enemy)
+        return new_enemy
+
+    # add a crate at pos
+    def add_crate(self, pos, size):
+        crate = Crate(pos, size)
+        self.crates.add(crate)
+        self.crate_index.insert(crate)
+        self.static_layer.add(crate.image, crate.rect.topleft)
+        self.cover.invalidate()
+        return crate
+
+    # the score on the hud, as a (surface, screen position) blit
+    def score_blit(self):
+        return render_text(get_font(*HEADING_FONT), "Score: " + str(self.score), (255, 221, 0)), (10, 550)
+
+    # draw everything onto the screen. alpha (0-1) is how far real time is
+    # into the next tick, moving things are drawn that far between their
+    # previous and current positions so motion stays smooth when frames are
+    # drawn more often than the simulation ticks
+    def draw(self, alpha=1):
+        if self.dirty_rects and self.last_drawn is not None and not self.camera.moved:
+            self.draw_dirty(alpha)
+            return
+
+        profiler = self.profiler
+
+        # draw background and fill screen
+        self.screen.fill((255, 255, 255))
+#        self.screen.blit(self.background, (0, 0))
+        self.screen.blit(*self.score_blit())
+#        self.screen.blit(self.ammo_icon, (0, 550))
+        if profiler is not None:
+            profiler.mark("hud_draw")
+
+        # queue everything in view, then blit it in one go
+        view = self.camera.view()
+        batch = self.batch
+        batch.offset = view.topleft
+        self.queue_enemies(batch, alpha, view)
+        if profiler is not None:
+            profiler.mark("enemy_draw")
+
+        self.static_layer.queue_draw(batch, view)
+        if profiler is not None:
+            profiler.mark("crate_draw")
+
+        for popuptext in self.popup_text:
+            popuptext.queue_draw(batch, alpha)
+        if profiler is not None:
+            profiler.mark("popup_draw")
 
         # draw scope
         x, y = self.mouse_pos
-        self.screen.blit(self.scope, (x - 50, y - 50))
+        batch.add(self.scope, (x - 50, y - 50))
+        batch.flush(self.screen)
+        if profiler is not None:
+            if profiler.overlay:
+                profiler.draw_overlay(self.screen, get_font(*SMALL_FONT))
+            profiler.mark("blits")
 
         pygame.display.flip()
+        if profiler is not None:
+            profiler.mark("flip")
+        self.camera.moved = False
+        if self.dirty_rects:
+            # the next dirty frame restores the whole screen once
+            self.last_drawn = [self.screen.get_rect()]
+
+    # redraw and present only what changed since the last frame
+    def draw_dirty(self, alpha=1):
+        profiler = self.profiler
+
+        # erase everything that was drawn over last frame
+        restored = self.last_drawn
+        for rect in restored:
+            self.screen.blit(self.backdrop, rect, rect)
+
+        drawn = [self.screen.blit(*self.score_blit())]
+        if profiler is not None:
+            profiler.mark("hud_draw")
+
+        view = self.camera.view()
+        batch = self.batch
+        batch.offset = view.topleft
+        self.queue_enemies(batch, alpha, view)
+        drawn.extend(batch.flush(self.screen, doreturn=True))
+        if profiler is not None:
+            profiler.mark("enemy_draw")
+
+        # crates don't move, only redraw the parts of them that were drawn over
+        dirty = restored + drawn
+        for chunk, (x, y) in self.static_layer.visible(view):
+            area = chunk.get_rect(topleft=(x - view.x, y - view.y))
+            for i in area.collidelistall(dirty):
+                clip = area.clip(dirty[i])
+                batch.add(chunk, (clip.x + view.x, clip.y + view.y), clip.move(-area.x, -area.y))
+        crates_drawn = len(batch)
+        if profiler is not None:
+            profiler.mark("crate_draw")
+
+        # popups and the scope go on top of crates
+        for popuptext in self.popup_text:
+            popuptext.queue_draw(batch, alpha)
+        x, y = self.mouse_pos
+        batch.add(self.scope, (x - 50, y - 50))
+        rects = batch.flush(self.screen, doreturn=True)
+        dirty.extend(rects)
+        drawn.extend(rects[crates_drawn:])
+        if profiler is not None:
+            profiler.mark("popup_draw")
+            if profiler.overlay:
+                # goes on top of everything, last frame's was restored above
+                area = profiler.draw_overlay(self.screen, get_font(*SMALL_FONT))
+                drawn.append(area)
+                dirty.append(area)
+            profiler.mark("blits")
+
+        pygame.display.update(dirty)
+        self.last_drawn = drawn
+        if profiler is not None:
+            profiler.mark("flip")
+
+    # the frame as immutable (hud blits, camera position, world blits, clicks
+    # resolved for the latency tracker), for drawing on another thread
+    # (see pipeline.py). taken right after a tick, so there is nothing to
+    # interpolate. the scope is left out, the drawing thread puts it at the
+    # newest mouse position
+    def snapshot(self):
+        view = self.camera.view()
+        batch = RenderBatch()
+        self.queue_enemies(batch, 1, view)
+        self.static_layer.queue_draw(batch, view)
+        for popuptext in self.popup_text:
+            popuptext.queue_draw(batch)
+        hud = (self.score_blit(),)
+        clicks = self.latency.resolve_count if self.latency is not None else 0
+        return hud, view.topleft, tuple(batch.items), clicks
+
+    # draw a snapshot() and the scope at mouse_pos (on the screen) and flip
+    def present(self, frame, mouse_pos):
+        hud, offset, blits, clicks = frame
+        self.screen.fill((255, 255, 255))
+        self.screen.blits(hud, doreturn=False)
+        batch = self.batch
+        batch.offset = offset
+        batch.extend(blits)
+        x, y = mouse_pos
+        batch.add(self.scope, (x - 50 + offset[0], y - 50 + offset[1]))
+        batch.flush(self.screen)
+        pygame.display.flip()
+        if self.latency is not None:
+            self.latency.presented(clicks)
+
+    # queue the enemies in view (a world pygame.Rect) into a
+    # render.RenderBatch
+    def queue_enemies(self, batch, alpha, view):
+        # everything is in view unless the camera scrolls. hp bars stick out
+        # 15 pixels above their enemy
+        bounds = None
+        if not self.camera.fixed:
+            bounds = (view.left, view.top - 15, view.right, view.bottom)
+        if self.enemy_store is not None:
+            self.enemy_store.queue_draw(batch, alpha, bounds)
+        elif bounds is None:
+            for enemy in self.enemies:
+                enemy.queue_draw(batch, alpha)
+        else:
+            x0, y0, x1, y1 = bounds
+            for enemy in self.enemies:
+                if enemy.x < x1 and enemy.x + enemy.width > x0 and \
+                        enemy.y < y1 and enemy.y + enemy.height > y0:
+                    enemy.queue_draw(batch, alpha)
+
+    # update entity groups
+    def update(self):
+        self.step()
+        self.timer.advance()
+        self.draw()
 
-    # shoot a bullet at (x, y)
+    # shoot at (x, y)
     def shoot(self, x, y):
-        # keeping the bullet code but making it near hitscan for now
-        self.bullets.append(Bullet(
-            spawn=(x, y),
-            speed=1000,
-            dmg=120,
-            aoe_dmg=0,
-            aoe_range=0,
-            apply_aoe_dropoff=False))
+        self.shots_fired += 1
+        self.fire(self.bullet_pool.acquire(spawn=(x, y), **self.shot_stats),
+            self.timer.get_ticks())
+
+    # resolve a shot with one raycast (see Bullet.raycast()), the bullet
+    # goes back to the pool afterwards. with the enemy store the shot waits
+    # in self.shots for resolve_shots()
+    def fire(self, bullet, current_time):
+        if self.enemy_store is not None:
+            self.shots.append(bullet)
+            return
+        hits = bullet.raycast(self.crate_index, self.enemy_index, self.MAX_DISTANCE)
+        if hits:
+            self.apply_hits(bullet, hits, current_time)
+        self.bullet_pool.release(bullet)
+
+    # resolve the shots in self.shots against every enemy of the enemy store
+    # in one vectorized pass (see hits.py), same result as firing them one
+    # at a time. also marks the clicks that fired them resolved for the
+    # latency tracker
+    def resolve_shots(self):
+        shots = self.shots
+        if shots:
+            self.shots = []
+            current_time = self.timer.get_ticks()
+            store = self.enemy_store
+            result = resolve_hits(shots, [shot.crate_depth(self.crate_index) for shot in shots],
+                store, self.MAX_DISTANCE)
+            store.hp[:store.size] = result.hp
+            kills = [0] * len(shots)
+            for shot_i, slot, damage, used_aoe, score_added in result.events:
+                self.show_hit(shots[shot_i], store.sprites[slot],
+                    damage, used_aoe, score_added, current_time)
+                if score_added:
+                    kills[shot_i] += 1
+            for shot_kills in kills:
+                self.count_kills(shot_kills)
+            self.score += result.score
+            for shot in shots:
+                self.bullet_pool.release(shot)
+
+        if self.unresolved_clicks:
+            if self.latency is not None:
+                for _ in range(self.unresolved_clicks):
+                    self.latency.resolve()
+            self.unresolved_clicks = 0
+
+    # run the headless simulation for a fixed number of ticks
+    def simulate(self, ticks):
+        if ticks > 0 and self.first_frame():
+            ticks -= 1
+        for _ in range(ticks):
+            if self.stopped:
+                break
+            self.headless_tick()
+
+    def headless_tick(self):
+        if self.profiler is not None:
+            self.profiler.begin_frame()
+        self.step()
+        self.timer.advance()
+        if self.profiler is not None:
+            self.end_profiled_frame()
+
+    # run the first frame on its own to time it for the startup report,
+    # returns whether it ran
+    def first_frame(self):
+        if not startup.report.active:
+            return False
+        with startup.report.step("first frame"):
+            if self.headless:
+                self.step()
+                self.timer.advance()
+            else:
+                pygame.event.pump()
+                self.process_events()
+                self.update()
+        startup.report.finish()
+        return True
 
     def loop(self):
+        if self.threaded and not self.headless:
+            self.loop_threaded()
+            return
+        self.first_frame()
+        last = time.perf_counter()
         while not self.stopped:
-            pygame.event.pump()
+            # headless: step as fast as possible, no events/drawing/frame cap
+            if self.headless:
+                self.headless_tick()
+                continue
 
-            # draw background and fill screen
-            self.screen.fill((255, 255, 255))
-#            self.screen.blit(self.background, (0, 0))
-            self.screen.blit(
-                heading_font.render("Score: " + str(self.score), True, (255, 221, 0)),
-                (10, 550))
-#            self.screen.blit(self.ammo_icon, (0, 550))
+            profiler = self.profiler
+            if profiler is not None:
+                profiler.begin_frame()
 
-            self.process_events()
-            self.update()
+            pygame.event.pump()
 
+            self.process_events()
+            if profiler is not None:
+                profiler.mark("events")
+
+            # simulate the real time that passed since the last frame in
+            # fixed ticks, then draw once. a slow frame is made up for with
+            # extra ticks next time, skipping the frames in between, instead
+            # of the game going into slow motion
+            now = time.perf_counter()
+            self.lag += (now - last) * 1000
+            last = now
+            ticks = self.catch_up()
+            if self.low_latency:
+                # late input polling: clicks that came in while simulating
+                # are shot and shown this frame instead of the next, and the
+                # scope is drawn where the cursor is now
+                self.process_events()
+                if self.live_input:
+                    self.mouse_pos = self.camera.to_world(pygame.mouse.get_pos())
+                if profiler is not None:
+                    profiler.mark("events")
+            self.draw(self.lag * self.tick_rate / 1000)
+            if self.latency is not None:
+                self.latency.presented(self.latency.resolve_count)
+
+            self.wait_for_frame()
+            if profiler is not None:
+                profiler.mark("idle")
+                self.end_profiled_frame(ticks)
+
+    # loop() with the simulation on a pipeline.SimulationThread. this thread
+    # handles events, passes the mouse on and presents the newest snapshot
+    def loop_threaded(self):
+        from pipeline import FrameBuffer, SimulationThread
+
+        self.first_frame()
+        frames = FrameBuffer()
+        self.simulation = SimulationThread(self, frames)
+        self.live_input = False # the mouse comes from this thread instead
+        self.simulation.start()
+        try:
+            while not self.stopped:
+                pygame.event.pump()
+                self.process_events()
+                mouse_pos = pygame.mouse.get_pos()
+                self.simulation.send("mouse", mouse_pos)
+
+                frame = frames.take(timeout=1 / self.frame_cap)
+                if frame is not None:
+                    self.present(frame, mouse_pos)
+                self.wait_for_frame()
+        finally:
+            self.stopped = True
+            self.simulation.join()
+            error = self.simulation.error
+            self.simulation = None
+            self.live_input = True
+        if error is not None:
+            raise error
+
+    # wait out the rest of the frame. clock.tick() sleeps and can oversleep
+    # by a few ms, the low latency mode spins instead to start the next frame
+    # (and read its input) on time
+    def wait_for_frame(self):
+        if self.low_latency:
+            self.clock.tick_busy_loop(self.frame_cap)
+        else:
             self.clock.tick(self.frame_cap)
 
+    # run the ticks due for self.lag ms of real time, at most
+    # max_ticks_per_frame of them. returns how many ran
+    def catch_up(self):
+        step = 1000 / self.tick_rate
+        ticks = 0
+        while self.lag >= step and ticks < self.max_ticks_per_frame:
+            self.step()
+            self.timer.advance()
+            self.lag -= step
+            ticks += 1
+        if self.lag >= step:
+            # too far behind to catch up, drop the backlog (the game slows
+            # down rather than spending every frame catching up)
+            self.lag %= step
+        return ticks
+
+    def end_profiled_frame(self, ticks=1):
+        self.profiler.end_frame(
+            enemies=len(self.enemies),
+            popups=len(self.popup_text),
+            ticks=ticks)
+
+# initialize only the display (and with it the event and timer) subsystems,
+# instead of everything pygame.init() brings up. fonts are initialized by
+# utils.get_font() once text is first drawn
+def init_display(headless):
+    if headless:
+        use_dummy_display()
+    elif not pygame.display.get_init():
+        pygame.display.init()
+
+# switch the display to the SDL dummy driver (no window)
+def use_dummy_display():
+    if pygame.display.get_init() and pygame.display.get_driver() == "dummy":
+        return
+    pygame.display.quit()
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pygame.display.init()
+
 if __name__ == "__main__":
-    window = Game(fps=60)
+    parser = argparse.ArgumentParser(description="PooperHunt")
+    parser.add_argument("--headless", action="store_true",
+        help="no window, no drawing, ticks run as fast as possible")
+    parser.add_argument("--ticks", type=int, help="stop after this many headless ticks")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--level", metavar="PATH", help="level file (default levels/default.json)")
+    parser.add_argument("--fps", type=int, default=60,
+        help="frame cap, e.g. 144 or 240 for high refresh rate displays")
+    parser.add_argument("--tick-rate", type=int, default=60,
+        help="simulation ticks per second of game time")
+    parser.add_argument("--enemy-store", action="store_true",
+        help="run with the numpy struct-of-arrays enemy store (thousands of enemies)")
+    parser.add_argument("--dirty-rects", action="store_true",
+        help="render with dirty rectangles instead of full redraws (low-end machines)")
+    parser.add_argument("--threaded", action="store_true",
+        help="simulate on a separate thread from drawing (multi-core machines)")
+    parser.add_argument("--low-latency", action="store_true",
+        help="aim clicks at the cursor position of the click event, poll input right "
+            "before drawing and busy-wait between frames (uses a full core)")
+    parser.add_argument("--latency", metavar="PATH",
+        help="time every click from event to shot to frame on screen, dump the "
+            "histograms to PATH (.json or .csv) on exit")
+    parser.add_argument("--record", metavar="PATH", help="record the session for replay.py")
+    parser.add_argument("--profile", metavar="PATH",
+        help="profile every frame, dump the last frames to PATH (.json or .csv) on exit")
+    parser.add_argument("--overlay", action="store_true",
+        help="show the profiler overlay (toggle with F3)")
+    parser.add_argument("--startup-report", action="store_true",
+        help="print the time spent on each import and init step")
+    args = parser.parse_args()
+    if args.threaded and (args.profile or args.overlay):
+        parser.error("--threaded can't be combined with --profile or --overlay")
+    if args.headless and (args.latency or args.low_latency):
+        parser.error("--latency and --low-latency need a window, not --headless")
+    # recordings store the seed as a uint32 (see replay.HEADER)
+    if args.record and args.seed is not None and not 0 <= args.seed < 2**32:
+        parser.error("--record needs a --seed from 0 to 4294967295")
+
+    with startup.report.step("Game()"):
+        window = Game(fps=args.fps, headless=args.headless, seed=args.seed,
+            tick_rate=args.tick_rate, level=args.level, threaded=args.threaded,
+            enemy_store=args.enemy_store, dirty_rects=args.dirty_rects,
+            low_latency=args.low_latency)
+    if args.record:
+        from replay import Recorder
+        window.recorder = Recorder(window)
+    if args.profile or args.overlay:
+        from profiler import FrameProfiler
+        window.profiler = FrameProfiler(budget_ms=1000 / window.frame_cap)
+        window.profiler.overlay = args.overlay
+    if args.latency:
+        window.latency = LatencyTracker()
     # pygame.display.set_icon(get_image("assets/canpooper_right.png", 200, 200))
-    window.loop()
+    if args.headless and args.ticks is not None:
+        window.simulate(args.ticks)
+    else:
+        window.loop()
+    if args.record:
+        window.recorder.save(args.record)
+    if args.profile:
+        window.profiler.dump(args.profile)
+    if args.latency:
+        window.latency.dump(args.latency, window.score)
+    if args.startup_report:
+        startup.report.print()
     print(f"Score: {window.score}")
+    if args.latency:
+        window.latency.print_summary()
+    # keep any newly scaled images for the next launch. only a cache, so
+    # a read-only or full disk doesn't fail the session
+    try:
+        atlas.save()
+    except (OSError, pygame.error) as e:
+        print(f"couldn't save the image atlas: {e}")
     pygame.quit()
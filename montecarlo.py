@@ -0,0 +1,229 @@
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import level as levels
+from profiler import percentiles
+
+# numpy is optional, only needed to write .npz results
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# monte carlo balance runner. plays many seeded headless sessions on a
+# process pool, each with an aim policy and one combination of the swept
+# parameters, and writes one row per session (score, kills, multi-kills,
+# tick times) plus a summary per combination
+#
+#   python3 montecarlo.py --sessions 32
+#   python3 montecarlo.py --sweep hp=60,100,150 damage=80,120 --out runs.npz
+#   python3 montecarlo.py --sweep spawn=500-2000,250-1000 panic=1,2,3 --policy random
+
+# name -> (default, parser for one value). spawn is the min-max ms between
+# spawns of every spawn point of the level
+PARAMS = {
+    "spawn": ((500, 2000), lambda v: tuple(int(x) for x in v.split("-"))),
+    "hp": (100, float),
+    "panic": (2, float),
+    "damage": (120, float),
+}
+
+# per session results, in output column order
+METRICS = ["score", "kills", "shots", "multi_kills", "best_multi_kill",
+    "enemies_left", "tick_mean_ms", "tick_p50_ms", "tick_p95_ms", "tick_max_ms"]
+
+# aim policies. each returns where to shoot this tick or None
+
+# shoot anywhere on the field
+def random_policy(game, rng, spread):
+    return rng.randint(0, game.world_width), rng.randint(0, game.world_height)
+
+# shoot at a random living enemy that isn't hiding behind a crate, off by a
+# normally distributed error of spread pixels
+def aim_policy(game, rng, spread):
+    targets = [enemy for enemy in game.enemies if not enemy.dead and enemy.mode != "hide"]
+    if not targets:
+        return None
+    x, y = rng.choice(targets).rect.center
+    return round(rng.gauss(x, spread)), round(rng.gauss(y, spread))
+
+POLICIES = {
+    "aim": aim_policy,
+    "random": random_policy,
+    "none": lambda game, rng, spread: None,
+}
+
+# the level with the spawn frequency of a parameter combination
+def make_level(path, params):
+    level = levels.load(path)
+    for spawn in level.spawns:
+        if spawn.every is not None:
+            spawn.every = params["spawn"]
+    return level
+
+# put the rest of a parameter combination into a freshly created game
+def apply_params(game, params):
+    game.enemy_stats["hp"] = params["hp"]
+    game.enemy_stats["panic_multiplier"] = params["panic"]
+    game.shot_stats["dmg"] = params["damage"]
+
+# play one session, returns its METRICS
+def run_session(task):
+    # imported in the worker, main.py brings up pygame
+    from main import Game
+
+    params, seed, ticks, policy, fire_rate, spread, enemy_store, level_path = task
+    game = Game(headless=True, seed=seed, enemy_store=enemy_store,
+        level=make_level(level_path, params))
+    apply_params(game, params)
+    # the policy gets its own rng so aiming doesn't change the game's
+    rng = random.Random(seed ^ 0x5EED)
+    aim = POLICIES[policy]
+
+    fire_every = max(1, round(game.tick_rate / fire_rate)) if fire_rate > 0 else 0
+    tick_ms = []
+    for tick in range(ticks):
+        if fire_every and tick % fire_every == 0:
+            pos = aim(game, rng, spread)
+            if pos is not None:
+                game.mouse_pos = pos
+                game.process_mouse_events()
+        start = time.perf_counter()
+        game.step()
+        tick_ms.append((time.perf_counter() - start) * 1000)
+        game.timer.advance()
+
+    stats = percentiles(tick_ms)
+    return {
+        "score": game.score,
+        "kills": game.kills,
+        "shots": game.shots_fired,
+        "multi_kills": sum(shots for kills, shots in game.multi_kills.items() if kills > 1),
+        "best_multi_kill": max(game.multi_kills, default=0),
+        "enemies_left": len(game.enemies),
+        "tick_mean_ms": stats["mean"],
+        "tick_p50_ms": stats["p50"],
+        "tick_p95_ms": stats["p95"],
+        "tick_max_ms": stats["max"],
+    }
+
+# every combination of the swept values (unswept parameters keep their default)
+def combinations(sweep):
+    names = list(PARAMS)
+    values = [sweep.get(name, [PARAMS[name][0]]) for name in names]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+def run(combos, sessions, ticks, policy, fire_rate, spread=8, seed=0, workers=None,
+        enemy_store=False, level_path=levels.DEFAULT_LEVEL):
+    seeds = random.Random(seed)
+    tasks = []
+    for params in combos:
+        for _ in range(sessions):
+            tasks.append((params, seeds.getrandbits(32), ticks, policy, fire_rate, spread,
+                enemy_store, level_path))
+
+    # one session per task, they are long enough that batching gains nothing.
+    # the pool is closed and joined rather than terminated, SDL turns the
+    # SIGTERM of Pool.terminate() into a quit event the workers never read
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(run_session, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    rows = []
+    for i, (task, result) in enumerate(zip(tasks, results)):
+        rows.append({"combo": i // sessions, "seed": task[1], **result})
+    return rows
+
+# columns of the results: combo index, swept parameters, seed, METRICS
+def columns(combos, rows):
+    res = {"combo": [row["combo"] for row in rows]}
+    for name in PARAMS:
+        values = [combos[row["combo"]][name] for row in rows]
+        if name == "spawn":
+            res["spawn_min"] = [low for low, _ in values]
+            res["spawn_max"] = [high for _, high in values]
+        else:
+            res[name] = values
+    res["seed"] = [row["seed"] for row in rows]
+    for metric in METRICS:
+        res[metric] = [row[metric] for row in rows]
+    return res
+
+# .npz (one array per column, needs numpy) or .csv
+def save(path, data):
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(list(data))
+            writer.writerows(zip(*data.values()))
+        return
+    if np is None:
+        raise ImportError("writing .npz results requires numpy, use a .csv path")
+    np.savez_compressed(path, **{name: np.asarray(values) for name, values in data.items()})
+
+def print_summary(combos, rows):
+    header = f"{'combo':<36}{'score':>10}{'kills':>8}{'multi':>7}{'tick p95':>10}"
+    print(header)
+    for combo_i, params in enumerate(combos):
+        combo_rows = [row for row in rows if row["combo"] == combo_i]
+        n = len(combo_rows)
+        label = " ".join(
+            f"{name}={'-'.join(map(str, value)) if name == 'spawn' else f'{value:g}'}"
+            for name, value in params.items())
+        score = sum(row["score"] for row in combo_rows) / n
+        kills = sum(row["kills"] for row in combo_rows) / n
+        multi = sum(row["multi_kills"] for row in combo_rows) / n
+        p95 = max(row["tick_p95_ms"] for row in combo_rows)
+        print(f"{label:<36}{score:>10.1f}{kills:>8.1f}{multi:>7.2f}{p95:>10.3f}")
+
+def parse_sweep(specs):
+    sweep = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        if name not in PARAMS or not values:
+            raise SystemExit(f"bad --sweep {spec!r}, expected one of {', '.join(PARAMS)}=v1,v2,...")
+        sweep[name] = [PARAMS[name][1](value) for value in values.split(",")]
+    return sweep
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="parallel PooperHunt balance runner")
+    parser.add_argument("--sweep", nargs="+", default=[], metavar="PARAM=V1,V2",
+        help="values to try for " + ", ".join(PARAMS) + " (spawn as min-max ms)")
+    parser.add_argument("--sessions", type=int, default=8, help="sessions per combination")
+    parser.add_argument("--ticks", type=int, default=60 * 60, help="ticks per session")
+    parser.add_argument("--policy", choices=POLICIES, default="aim")
+    parser.add_argument("--fire-rate", type=float, default=2, help="shots per second")
+    parser.add_argument("--spread", type=float, default=8,
+        help="aim error of the aim policy in pixels (standard deviation)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the session seeds")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+        help="worker processes (default: all cores)")
+    parser.add_argument("--enemy-store", action="store_true",
+        help="run with the numpy struct-of-arrays enemy store")
+    parser.add_argument("--level", metavar="PATH", default=levels.DEFAULT_LEVEL)
+    parser.add_argument("--out", metavar="PATH", help="write every session to PATH (.npz or .csv)")
+    args = parser.parse_args(argv)
+
+    combos = combinations(parse_sweep(args.sweep))
+    start = time.perf_counter()
+    rows = run(combos, args.sessions, args.ticks, args.policy, args.fire_rate,
+        args.spread, args.seed, args.workers, args.enemy_store, args.level)
+    elapsed = time.perf_counter() - start
+
+    print_summary(combos, rows)
+    print(f"{len(rows)} sessions in {elapsed:.1f} s on {args.workers} workers")
+    if args.out:
+        save(args.out, columns(combos, rows))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import collections
+import threading
+import time
+
+# threaded simulation/render split (python3 main.py --threaded). the
+# simulation runs on its own thread in fixed ticks of real time and after
+# every batch of ticks publishes an immutable snapshot of the frame (the
+# blits and camera position, see Game.snapshot()). the main thread keeps
+# the window: it pumps events, forwards the input to the simulation and
+# blits + flips the newest snapshot (blits and flip release the GIL in SDL),
+# so on a multi-core machine the next ticks are simulated while a frame is
+# being presented
+#
+# nothing but snapshots and input crosses between the threads (and the
+# click queues of latency.LatencyTracker, deques). surfaces in
+# a snapshot are shared images (sprites, cached text and hp bars) that are
+# never drawn onto after they are created
+
+# the two frame slots: the one being presented and the newest published one.
+# publish() replaces the back slot, a frame the main thread never got to is
+# dropped, the main thread always presents the newest
+class FrameBuffer:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.back = None
+        self.front = None
+        self.published = 0 # frames published so far
+        self.dropped = 0 # published frames replaced before being presented
+
+    def publish(self, frame):
+        with self.condition:
+            if self.back is not None:
+                self.dropped += 1
+            self.back = frame
+            self.published += 1
+            self.condition.notify()
+
+    # swap the newest frame to the front and return it, None if no new frame
+    # was published within timeout seconds
+    def take(self, timeout=None):
+        with self.condition:
+            if self.back is None:
+                self.condition.wait(timeout)
+            if self.back is None:
+                return None
+            self.front, self.back = self.back, None
+            return self.front
+
+class SimulationThread(threading.Thread):
+    def __init__(self, game, frames):
+        super().__init__(name="simulation", daemon=True)
+        self.game = game
+        self.frames = frames
+        # ("mouse", pos), ("click", pos) (screen positions) and ("scroll",
+        # (dx, dy)) from the main thread, applied before the next tick
+        self.inputs = collections.deque()
+        # set by a click, wakes the simulation up to shoot right away
+        # instead of at the next tick
+        self.wake = threading.Event()
+        self.error = None # exception that stopped the simulation
+
+    # called from the main thread
+    def send(self, kind, value):
+        self.inputs.append((kind, value))
+        if kind == "click":
+            self.wake.set()
+
+    # returns whether there were clicks
+    def apply_inputs(self):
+        game = self.game
+        inputs = self.inputs
+        clicked = False
+        self.wake.clear()
+        while inputs:
+            kind, value = inputs.popleft()
+            if kind == "scroll":
+                game.scroll_dir = value
+                continue
+            game.mouse_pos = game.camera.to_world(value)
+            if kind == "click":
+                game.process_mouse_events()
+                clicked = True
+        if clicked:
+            game.resolve_shots()
+        return clicked
+
+    def run(self):
+        game = self.game
+        step = 1000 / game.tick_rate
+        last = time.perf_counter()
+        try:
+            while not game.stopped:
+                clicked = self.apply_inputs()
+                now = time.perf_counter()
+                game.lag += (now - last) * 1000
+                last = now
+                # a frame with the shots' hits goes out without waiting for a tick
+                if game.catch_up() or clicked:
+                    self.frames.publish(game.snapshot())
+                else:
+                    # nothing due yet, sleep until the next tick is or a click
+                    self.wake.wait(max(0, step - game.lag) / 1000)
+        except BaseException as e:
+            self.error = e
+            game.stopped = True
+        finally:
+            # wake the main thread up if it is waiting for a frame
+            with self.frames.condition:
+                self.frames.condition.notify()
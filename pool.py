@@ -0,0 +1,31 @@
+# free list of objects that are created and thrown away all the time
+# (bullets, actions, enemies). acquire() takes the constructor's arguments and
+# hands back a released object re-initialized with reset(*args, **kwargs), or
+# a new one from factory if none are free. both acquire() and release() are
+# O(1) and only `limit` released objects are kept around
+class Pool:
+    def __init__(self, factory, limit=1024):
+        self.factory = factory
+        self.limit = limit
+        self.free = []
+
+    # number of objects waiting to be reused
+    def __len__(self):
+        return len(self.free)
+
+    def acquire(self, *args, **kwargs):
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args, **kwargs)
+            return obj
+        return self.factory(*args, **kwargs)
+
+    # the object must not be used by its old owner after this
+    def release(self, obj):
+        if len(self.free) < self.limit:
+            self.free.append(obj)
+
+    def release_all(self, objs):
+        room = self.limit - len(self.free)
+        if room > 0:
+            self.free.extend(objs[:room])
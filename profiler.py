@@ -0,0 +1,125 @@
+import csv
+import json
+import time
+from array import array
+
+# per-frame phase profiler. Game calls begin_frame(), then mark(phase) right
+# after each phase finishes (the time since the previous mark is charged to
+# that phase) and end_frame(counts). the last `capacity` frames are kept in
+# fixed-size ring buffers, so profiling a long session costs no memory growth
+
+class FrameProfiler:
+    def __init__(self, capacity=600, budget_ms=1000 / 60):
+        self.capacity = capacity
+        self.budget_ms = budget_ms # frames slower than this count as spikes
+        self.index = 0 # next slot to write
+        self.frames = 0 # total frames recorded
+        self.phases = {} # phase -> ring buffer of ms
+        self.counts = {} # name -> ring buffer of entity counts
+        self.frame_ms = array("d", bytes(8 * capacity))
+        self.frame_start = 0
+        self.last_mark = 0
+        self.overlay = False # draw stats on screen (toggled with F3)
+
+    def begin_frame(self):
+        self.frame_start = self.last_mark = time.perf_counter()
+        # phases that don't run this frame read 0
+        for samples in self.phases.values():
+            samples[self.index] = 0
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        samples = self.phases.get(phase)
+        if samples is None:
+            samples = self.phases[phase] = array("d", bytes(8 * self.capacity))
+        samples[self.index] += (now - self.last_mark) * 1000
+        self.last_mark = now
+
+    def end_frame(self, **counts):
+        self.frame_ms[self.index] = (time.perf_counter() - self.frame_start) * 1000
+        for name, count in counts.items():
+            samples = self.counts.get(name)
+            if samples is None:
+                samples = self.counts[name] = array("d", bytes(8 * self.capacity))
+            samples[self.index] = count
+        self.index = (self.index + 1) % self.capacity
+        self.frames += 1
+
+    # samples in the buffer, oldest first
+    def samples(self, buffer):
+        if self.frames < self.capacity:
+            return list(buffer[:self.frames])
+        return list(buffer[self.index:]) + list(buffer[:self.index])
+
+    def summary(self):
+        res = {
+            "frames": self.frames,
+            "frame_ms": percentiles(self.samples(self.frame_ms)),
+            "spikes": sum(ms > self.budget_ms for ms in self.samples(self.frame_ms)),
+            "phases_ms": {
+                phase: percentiles(self.samples(samples))
+                for phase, samples in self.phases.items()},
+            "counts": {
+                name: percentiles(self.samples(samples))
+                for name, samples in self.counts.items()},
+        }
+        return res
+
+    # write the buffered frames as csv (one row per frame) or the summary
+    # plus every frame as json, depending on the file extension
+    def dump(self, path):
+        columns = ["frame_ms"] + list(self.phases) + [name + "_count" for name in self.counts]
+        buffers = [self.frame_ms] + list(self.phases.values()) + list(self.counts.values())
+        rows = list(zip(*(self.samples(buffer) for buffer in buffers)))
+
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                writer.writerows(rows)
+        else:
+            with open(path, "w") as f:
+                json.dump({
+                    "summary": self.summary(),
+                    "columns": columns,
+                    "frames": rows,
+                }, f)
+
+    def draw_overlay(self, screen, font):
+        # imported here to keep the profiler usable without a display
+        import pygame
+        from utils import render_text
+
+        summary = self.summary()
+        frame = summary["frame_ms"]
+        lines = [
+            f"frame p50 {frame['p50']:.2f} p95 {frame['p95']:.2f} "
+            f"p99 {frame['p99']:.2f} max {frame['max']:.2f} ms",
+            f"spikes > {self.budget_ms:.1f} ms: {summary['spikes']}/{min(self.frames, self.capacity)}",
+        ]
+        phases = sorted(summary["phases_ms"].items(), key=lambda p: -p[1]["p95"])
+        for phase, stats in phases:
+            lines.append(f"{phase:<12} p50 {stats['p50']:.2f} p95 {stats['p95']:.2f}")
+        lines.append(" ".join(
+            f"{name} {stats['max']:.0f}" for name, stats in summary["counts"].items()))
+
+        # returns the rect drawn over, for Game.draw_dirty()
+        y = 5
+        rects = []
+        for line in lines:
+            rects.append(screen.blit(render_text(font, line, (255, 0, 0)), (5, y)))
+            y += rects[-1].height
+        return pygame.Rect(rects[0]).unionall(rects)
+
+def percentiles(samples):
+    if not samples:
+        return {"mean": 0, "p50": 0, "p95": 0, "p99": 0, "max": 0}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {
+        "mean": sum(ordered) / len(ordered),
+        "p50": ordered[round(last * 0.50)],
+        "p95": ordered[round(last * 0.95)],
+        "p99": ordered[round(last * 0.99)],
+        "max": ordered[-1],
+    }
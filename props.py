@@ -1,8 +1,5 @@
 from entity import Entity
-import pygame
-
-pygame.font.init()
-arial = pygame.font.SysFont('arial', 20)
+from utils import render_text, get_font
 
 class Crate(Entity):
     name = "crate"
@@ -17,17 +14,19 @@ class PopupText(Entity):
     def __init__(self,
             text="",
             spawn=(0, 0),
-            font=arial,
+            font=("arial", 20), # (name, size) for utils.get_font()
             color=(0, 0, 0),
             destroy=0):
 
-        super().__init__(spawn=spawn)
+        # no image, only the text is drawn
+        super().__init__(image=None, spawn=spawn)
 
         self.text = text
         self.font = font
         self.color = color
         self.destroy = destroy # removal time
 
-    def draw(self, screen):
-        rendered_text = self.font.render(self.text, True, self.color)
-        screen.blit(rendered_text, (self.x, self.y))
+    def queue_draw(self, batch, alpha=1):
+        rendered_text = render_text(get_font(*self.font), self.text, self.color)
+        dx, dy = self.render_offset(alpha)
+        batch.add(rendered_text, (self.x + dx, self.y + dy))
@@ -0,0 +1,117 @@
+import pygame
+
+# batched drawing. instead of every sprite blitting itself (and drawing its
+# hp bar with two pygame.draw.rect calls), the draw code queues (surface,
+# position) pairs into a RenderBatch and the whole batch goes to the screen
+# in one Surface.blits() call (fblits() where pygame has it and the drawn
+# areas aren't needed)
+
+class RenderBatch:
+    def __init__(self):
+        self.items = [] # (surface, dest) or (surface, dest, area)
+        # subtracted from every dest when flushed (the camera position, see
+        # camera.py), so entities can queue their world positions
+        self.offset = (0, 0)
+
+    def __len__(self):
+        return len(self.items)
+
+    # area is the part of surface to blit, all of it by default
+    def add(self, surface, dest, area=None):
+        if area is None:
+            self.items.append((surface, dest))
+        else:
+            self.items.append((surface, dest, area))
+
+    def extend(self, items):
+        self.items.extend(items)
+
+    # blit everything queued so far in order and empty the batch. with
+    # doreturn the areas drawn over are returned
+    def flush(self, screen, doreturn=False):
+        items = self.items
+        self.items = []
+        if not items:
+            return []
+        if self.offset != (0, 0):
+            ox, oy = self.offset
+            items = [(item[0], (item[1][0] - ox, item[1][1] - oy)) + item[2:] for item in items]
+        if not doreturn and hasattr(screen, "fblits"):
+            screen.fblits(items)
+            return []
+        return screen.blits(items, doreturn=doreturn) or []
+
+# static images (crates) pre-rendered into chunks of the world, so drawing
+# them is one blit per chunk in view instead of one per image, however many
+# there are. a chunk's surface only covers the part of it that has images
+# in it, a chunk with one crate costs what the crate did. chunks are
+# (re)rendered on first draw after an image is added to them
+class StaticLayer:
+    def __init__(self, chunk_size=512):
+        self.chunk_size = chunk_size
+        self.images = {} # (cx, cy) -> [(surface, rect)] overlapping the chunk
+        self.chunks = {} # (cx, cy) -> (surface, world position), rendered
+
+    def __len__(self):
+        return len(self.images)
+
+    def add(self, surface, pos):
+        rect = surface.get_rect(topleft=pos)
+        size = self.chunk_size
+        for cx in range(rect.left // size, (rect.right - 1) // size + 1):
+            for cy in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                self.images.setdefault((cx, cy), []).append((surface, rect))
+                self.chunks.pop((cx, cy), None)
+
+    def render_chunk(self, key):
+        size = self.chunk_size
+        area = pygame.Rect(key[0] * size, key[1] * size, size, size)
+        images = self.images[key]
+        # only the part of the chunk that has something in it
+        bounds = images[0][1].unionall([rect for _, rect in images[1:]]).clip(area)
+        chunk = pygame.Surface(bounds.size, pygame.SRCALPHA)
+        chunk.fill((0, 0, 0, 0))
+        chunk.blits([(surface, (rect.x - bounds.x, rect.y - bounds.y)) for surface, rect in images],
+            doreturn=False)
+        res = self.chunks[key] = (chunk, bounds.topleft)
+        return res
+
+    # (surface, world position) of the chunks that overlap view (a world
+    # pygame.Rect)
+    def visible(self, view):
+        size = self.chunk_size
+        chunks = self.chunks
+        images = self.images
+        res = []
+        for cx in range(view.left // size, (view.right - 1) // size + 1):
+            for cy in range(view.top // size, (view.bottom - 1) // size + 1):
+                key = (cx, cy)
+                chunk = chunks.get(key)
+                if chunk is None:
+                    if key not in images:
+                        continue
+                    chunk = self.render_chunk(key)
+                res.append(chunk)
+        return res
+
+    def queue_draw(self, batch, view):
+        batch.extend(self.visible(view))
+
+# pre-rendered hp bars: (width, filled pixels) -> surface. the fill is
+# quantized to whole pixels, which is all draw.rect could show anyway, so
+# there are at most width - 5 bars per entity width
+hp_bars = {}
+
+# hp bar for an entity width at hp fraction, drawn at (x, y - 15)
+def hp_bar(width, fraction):
+    # same rounding as the pygame.draw.rect call this replaces
+    filled = int((width - 6) * max(0, fraction))
+    key = (width, filled)
+    bar = hp_bars.get(key)
+    if bar is None:
+        bar = pygame.Surface((width, 10), pygame.SRCALPHA)
+        bar.fill((0, 0, 0, 0))
+        pygame.draw.rect(bar, (0, 0, 0), (0, 0, width, 10), 1)
+        pygame.draw.rect(bar, (0, 255, 0), (3, 3, filled, 4))
+        hp_bars[key] = bar
+    return bar
@@ -0,0 +1,215 @@
+import argparse
+import os
+import struct
+import sys
+import time
+import zlib
+
+import pygame
+
+import level as levels
+
+# session recording and replay. a recording is the game's rng seed plus, for
+# every frame, the game time, the mouse position (in the world) and the input
+# events that were handled before it (clicks, enemy state changes and camera
+# moves, which decide what is simulated at full rate), which is all the
+# simulation reads. replaying feeds them back into a Game on a fake timer,
+# either paced in real time with rendering or as fast as possible headless.
+# the header also names the level file and hashes the level (see
+# level.digest()), replays load that file and refuse a different level
+#
+#   python3 main.py --record session.rec
+#   python3 replay.py session.rec               fast, headless
+#   python3 replay.py session.rec --realtime    in a window at recorded speed
+
+MAGIC = b"PHRC"
+VERSION = 2
+# magic, version, seed, tick rate, flags, level digest, level path bytes
+# (followed by the path, utf-8)
+HEADER = struct.Struct("<4sBIHB16sH")
+FRAME = struct.Struct("<IiiH") # ticks, mouse x, mouse y, event bytes
+POS = struct.Struct("<ii")
+
+# event codes (a click is followed by the POS it was aimed at, a camera move
+# by the new camera POS)
+CLICK = 1
+STATE_CHANGE = 2
+CAMERA = 3
+
+# header flags
+FLAG_ENEMY_STORE = 1
+
+# level paths inside the game's directory are stored relative to it, so
+# recordings of the bundled levels still replay from another checkout
+GAME_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Recorder:
+    def __init__(self, game):
+        self.seed = game.seed
+        self.fps = game.tick_rate
+        self.flags = FLAG_ENEMY_STORE if game.enemy_store is not None else 0
+        self.level_digest = levels.digest(game.level)
+        self.level_path = "" # empty for a level not loaded from a file
+        if game.level.path is not None:
+            self.level_path = game.level.path
+            if os.path.commonpath([GAME_DIR, self.level_path]) == GAME_DIR:
+                self.level_path = os.path.relpath(self.level_path, GAME_DIR)
+        self.data = bytearray()
+        self.events = bytearray() # events since the last frame
+        self.frames = 0
+
+    def click(self, pos):
+        self.events.append(CLICK)
+        self.events += POS.pack(*pos)
+
+    def state_change(self):
+        self.events.append(STATE_CHANGE)
+
+    def camera(self, pos):
+        self.events.append(CAMERA)
+        self.events += POS.pack(*pos)
+
+    # called at the start of every Game.step()
+    def frame(self, ticks, mouse_pos):
+        x, y = mouse_pos
+        self.data += FRAME.pack(ticks, x, y, len(self.events))
+        self.data += self.events
+        self.events.clear()
+        self.frames += 1
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            level_path = self.level_path.encode()
+            f.write(HEADER.pack(MAGIC, VERSION, self.seed, self.fps, self.flags,
+                self.level_digest, len(level_path)))
+            f.write(level_path)
+            f.write(zlib.compress(bytes(self.data), 9))
+
+class Recording:
+    def __init__(self, seed, fps, flags, level_digest, level_path, frames):
+        self.seed = seed
+        self.fps = fps # simulation ticks per second
+        self.flags = flags
+        self.level_digest = level_digest # levels.digest() of the level
+        self.level_path = level_path # relative to GAME_DIR, None if unknown
+        self.frames = frames # [(ticks, (mouse x, mouse y), events)]
+
+def load(path):
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size or header[:5] != MAGIC + bytes([VERSION]):
+            raise ValueError(f"{path} is not a PooperHunt recording (version {VERSION})")
+        _, _, seed, fps, flags, level_digest, path_size = HEADER.unpack(header)
+        level_path = f.read(path_size).decode()
+        data = zlib.decompress(f.read())
+
+    frames = []
+    pos = 0
+    while pos < len(data):
+        ticks, x, y, size = FRAME.unpack_from(data, pos)
+        pos += FRAME.size
+        frames.append((ticks, (x, y), parse_events(data[pos:pos + size])))
+        pos += size
+    return Recording(seed, fps, flags, level_digest,
+        os.path.join(GAME_DIR, level_path) if level_path else None, frames)
+
+# [(CLICK or CAMERA, (x, y)) or (STATE_CHANGE, None)]
+def parse_events(data):
+    events = []
+    pos = 0
+    while pos < len(data):
+        code = data[pos]
+        pos += 1
+        if code in (CLICK, CAMERA):
+            events.append((code, POS.unpack_from(data, pos)))
+            pos += POS.size
+        else:
+            events.append((code, None))
+    return events
+
+# re-simulate a recording on level (a level.Level or a level file path,
+# default the one it was recorded on), returns the finished Game. raises
+# ValueError if that is not the level it was recorded on
+def replay(recording, realtime=False, level=None):
+    # imported here so main.py can import this module for --record
+    from main import Game
+    from timing import FixedTimer
+
+    if level is None:
+        level = recording.level_path
+        if level is None or not os.path.exists(level):
+            raise ValueError(f"the recorded level {level or '(not a file)'} "
+                "isn't there, pass it with --level")
+    if isinstance(level, str):
+        level = levels.load(level)
+    if levels.digest(level) != recording.level_digest:
+        raise ValueError("the recording was made on a different level")
+
+    game = Game(
+        fps=recording.fps,
+        tick_rate=recording.fps,
+        headless=not realtime,
+        timer=FixedTimer(),
+        enemy_store=bool(recording.flags & FLAG_ENEMY_STORE),
+        seed=recording.seed,
+        level=level)
+    # all input comes from the recording
+    game.live_input = False
+    game.next_state_change = float("inf")
+    if realtime:
+        # pygame.time.get_ticks() needs the timer subsystem, which
+        # main.init_display() leaves out
+        start = time.perf_counter()
+        first_ticks = recording.frames[0][0] if recording.frames else 0
+
+    for ticks, mouse_pos, events in recording.frames:
+        if realtime:
+            if pygame.event.get(pygame.QUIT):
+                break
+            delay = (ticks - first_ticks) / 1000 - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        # the events happened at this frame's time, the live game shoots
+        # after the timer advanced to it
+        game.timer.ticks = ticks
+        for event, pos in events:
+            if event == CLICK:
+                game.mouse_pos = pos
+                game.process_mouse_events()
+                continue
+            # the live game resolved the clicks before its tick
+            game.resolve_shots()
+            if event == STATE_CHANGE:
+                game.change_enemy_states()
+            elif event == CAMERA:
+                game.camera.move_to(*pos)
+
+        game.mouse_pos = mouse_pos
+        game.step()
+        if realtime:
+            game.draw()
+
+    return game
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="replay a recorded PooperHunt session")
+    parser.add_argument("recording")
+    parser.add_argument("--realtime", action="store_true",
+        help="play back in a window at the recorded speed")
+    parser.add_argument("--level", metavar="PATH",
+        help="the level the session was recorded on, if not the recorded file")
+    args = parser.parse_args(argv)
+
+    try:
+        recording = load(args.recording)
+        game = replay(recording, realtime=args.realtime, level=args.level)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"frames: {len(recording.frames)}")
+    print(f"Score: {game.score}")
+    pygame.quit()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+import heapq
+import itertools
+
+START, END, WAKE = range(3)
+
+# central min-heap of timed enemy events (action starts/ends and wake-ups).
+# enemies no longer poll their own action lists every frame, they are
+# told when one of their actions starts or ends and can sleep in between
+class ActionScheduler:
+    def __init__(self):
+        # (time, strict, seq, kind, enemy, generation, action). strict events
+        # only fire once current_time has passed time, which matches actions
+        # running up to and including start + duration
+        self.events = []
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.events)
+
+    def push(self, time, strict, kind, enemy, action=None):
+        heapq.heappush(self.events, (time, strict, next(self.counter), kind,
+            enemy, enemy.schedule_generation, action))
+
+    # schedule the start and end of an enemy's action
+    def add(self, enemy, action):
+        self.push(action.start, False, START, enemy, action)
+        self.push(action.start + action.duration, True, END, enemy, action)
+
+    # wake an enemy up at time
+    def wake_at(self, enemy, time):
+        self.push(time, False, WAKE, enemy)
+
+    # fire every event that is due. events of enemies whose actions were
+    # cancelled since (enemy.schedule_generation changed) are dropped
+    def advance(self, current_time):
+        events = self.events
+        while events:
+            time, strict, _, kind, enemy, generation, action = events[0]
+            if time > current_time or (strict and time == current_time):
+                break
+            heapq.heappop(events)
+
+            if generation != enemy.schedule_generation:
+                continue
+            if kind == START:
+                enemy.start_action(action)
+            elif kind == END:
+                enemy.end_action(action, current_time)
+            else:
+                enemy.asleep = False
@@ -0,0 +1,249 @@
+import argparse
+import csv
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+from collections import Counter
+
+import level as levels
+import render
+import utils
+from enemy import action_pool
+from montecarlo import POLICIES
+
+# soak test. plays hours of game time headless with an aim policy and
+# samples memory (tracemalloc), object counts per class, the size of every
+# group, pool and cache and the cost of a tick at intervals. after a warmup
+# a line is fitted through every series, and anything still growing by the
+# end fails the run with a report
+#
+#   python3 soak.py                        one hour of game time
+#   python3 soak.py --hours 8 --out soak.csv
+#   python3 soak.py --hours 0.25 --sample-every 10 --enemy-store
+
+# a series of counts only fails if it grew by more than this many objects
+MIN_COUNT_GROWTH = 100
+
+# sizes of the game's groups, pools and caches
+def group_sizes(game):
+    return {
+        "enemies": len(game.enemies),
+        "popups": len(game.popup_text),
+        "shots": len(game.shots),
+        "crates": len(game.crates),
+        "scheduled_actions": sum(len(enemy.scheduled) for enemy in game.enemies),
+        "scheduler_events": len(game.scheduler),
+        "spawn_queue": len(game.spawn_queue),
+        "enemy_pool": len(game.enemy_pool),
+        "bullet_pool": len(game.bullet_pool),
+        "action_pool": len(action_pool),
+        "image_cache": len(utils.cache),
+        "text_cache": len(utils.text_cache.surfaces),
+        "hp_bars": len(render.hp_bars),
+    }
+
+# live objects tracked by the garbage collector, per class
+def object_counts():
+    return Counter(type(obj).__name__ for obj in gc.get_objects())
+
+# allocations of the soak test itself (its samples grow by design) are left
+# out of the traced memory
+TRACE_FILTERS = [
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+]
+
+# traced memory of the game, in KB
+def traced_kb():
+    snapshot = tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS)
+    return sum(stat.size for stat in snapshot.statistics("filename")) / 1024
+
+# least squares line through (xs, ys), returns its value at the first and
+# last x
+def fit(xs, ys):
+    n = len(xs)
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    var = sum((x - mean_x)**2 for x in xs)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var if var else 0
+    start = mean_y + slope * (xs[0] - mean_x)
+    end = mean_y + slope * (xs[-1] - mean_x)
+    return start, end
+
+class Soak:
+    def __init__(self, game, policy="aim", fire_rate=2, spread=8, trace=True):
+        self.game = game
+        self.aim = POLICIES[policy]
+        self.rng = random.Random(game.seed ^ 0x5EED)
+        self.fire_every = max(1, round(game.tick_rate / fire_rate)) if fire_rate > 0 else 0
+        self.spread = spread
+        self.trace = trace
+        self.ticks = 0
+        # series -> one value per sample, in arrays so the samples don't
+        # allocate a python object per value
+        self.samples = 0
+        self.series = {"hours": array("d")}
+        self.warmup_snapshot = None # tracemalloc snapshot at the end of the warmup
+        self.end_snapshot = None
+
+    # play ticks ticks, returns the mean ms per tick
+    def play(self, ticks):
+        game = self.game
+        spent = 0
+        for _ in range(ticks):
+            if self.fire_every and self.ticks % self.fire_every == 0:
+                pos = self.aim(game, self.rng, self.spread)
+                if pos is not None:
+                    game.mouse_pos = pos
+                    game.process_mouse_events()
+            start = time.perf_counter()
+            game.step()
+            spent += time.perf_counter() - start
+            game.timer.advance()
+            self.ticks += 1
+        return spent * 1000 / ticks
+
+    def sample(self, tick_ms):
+        game = self.game
+        row = {"hours": game.timer.get_ticks() / 3600000, "tick_ms": tick_ms}
+        if self.trace:
+            row["traced_kb"] = traced_kb()
+        row.update(group_sizes(game))
+        for name, count in object_counts().items():
+            row["objects." + name] = count
+
+        series = self.series
+        for name, value in row.items():
+            values = series.get(name)
+            if values is None:
+                # first seen now, zero in the earlier samples
+                values = series[name] = array("d", bytes(8 * self.samples))
+            values.append(value)
+        self.samples += 1
+        for values in series.values():
+            if len(values) < self.samples:
+                values.append(0)
+
+        print(f"{row['hours']:.3f} h: {tick_ms:.3f} ms/tick, {row['enemies']} enemies"
+            + (f", {row['traced_kb']:.0f} KB traced" if self.trace else ""), flush=True)
+
+    def run(self, hours, sample_every, warmup):
+        game = self.game
+        interval = max(1, round(sample_every * game.tick_rate))
+        total = round(hours * 3600 * game.tick_rate)
+        warmup_ticks = round(warmup * 3600 * game.tick_rate)
+        if self.trace:
+            tracemalloc.start()
+        try:
+            while self.ticks < total and not game.stopped:
+                tick_ms = self.play(min(interval, total - self.ticks))
+                self.sample(tick_ms)
+                if self.trace and self.warmup_snapshot is None and self.ticks >= warmup_ticks:
+                    self.warmup_snapshot = tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS)
+            if self.trace:
+                self.end_snapshot = tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS)
+        finally:
+            if self.trace:
+                tracemalloc.stop()
+
+    # {series: (start, end)} of the lines fitted through the samples after
+    # the warmup
+    def trends(self, warmup):
+        hours = self.series["hours"]
+        first = next((i for i, h in enumerate(hours) if h > warmup), len(hours))
+        if len(hours) - first < 3:
+            return {}
+        xs = hours[first:]
+        return {name: fit(xs, values[first:])
+            for name, values in sorted(self.series.items()) if name != "hours"}
+
+# the trends that fail the run, [(series, start, end, reason)]
+def failures(trends, hours, max_memory_growth, max_cost_growth, max_count_growth):
+    res = []
+    for name, (start, end) in trends.items():
+        growth = end - start
+        if name == "traced_kb":
+            per_hour = growth / hours if hours > 0 else 0
+            if per_hour > max_memory_growth:
+                res.append((name, start, end, f"memory grows {per_hour:.0f} KB/hour"))
+        elif name == "tick_ms":
+            if start > 0 and growth / start > max_cost_growth:
+                res.append((name, start, end, f"tick cost grew {growth / start:.0%}"))
+        elif growth > MIN_COUNT_GROWTH and growth / max(start, 1) > max_count_growth:
+            res.append((name, start, end, f"grew by {growth:.0f} ({growth / max(start, 1):.0%})"))
+    return res
+
+def print_report(soak, trends, failed, top=10):
+    print(f"{soak.ticks} ticks, {soak.game.timer.get_ticks() / 3600000:.2f} hours of game time, "
+        f"{soak.samples} samples")
+    print(f"{'series':<32}{'start':>12}{'end':>12}")
+    shown = [name for name in trends if not name.startswith("objects.")]
+    # only the classes that grew the most, there are hundreds
+    classes = sorted((name for name in trends if name.startswith("objects.")),
+        key=lambda name: trends[name][1] - trends[name][0], reverse=True)
+    for name in shown + classes[:top]:
+        start, end = trends[name]
+        print(f"{name:<32}{start:>12.2f}{end:>12.2f}")
+
+    if soak.warmup_snapshot is not None and soak.end_snapshot is not None:
+        print()
+        print("allocation growth since the warmup:")
+        for stat in soak.end_snapshot.compare_to(soak.warmup_snapshot, "lineno")[:top]:
+            print(f"  {stat}")
+
+    print()
+    if not failed:
+        print("PASS: nothing grows")
+        return
+    print("FAIL:")
+    for name, start, end, reason in failed:
+        print(f"  {name}: {reason} ({start:.2f} -> {end:.2f})")
+
+def save(path, series):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(series))
+        writer.writerows(zip(*series.values()))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PooperHunt soak test")
+    parser.add_argument("--hours", type=float, default=1, help="hours of game time to play")
+    parser.add_argument("--sample-every", type=float, default=60, metavar="SECONDS",
+        help="seconds of game time between samples")
+    parser.add_argument("--warmup", type=float, default=0.1, metavar="HOURS",
+        help="game time before caches and pools are expected to have settled")
+    parser.add_argument("--policy", choices=POLICIES, default="aim")
+    parser.add_argument("--fire-rate", type=float, default=2, help="shots per second")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--enemy-store", action="store_true",
+        help="run with the numpy struct-of-arrays enemy store")
+    parser.add_argument("--level", metavar="PATH", default=levels.DEFAULT_LEVEL)
+    parser.add_argument("--no-tracemalloc", action="store_true",
+        help="don't trace allocations (much faster ticks, no memory series)")
+    parser.add_argument("--max-memory-growth", type=float, default=512, metavar="KB",
+        help="traced memory growth per hour that fails the run")
+    parser.add_argument("--max-cost-growth", type=float, default=0.25, metavar="FRACTION",
+        help="growth of the mean tick time that fails the run")
+    parser.add_argument("--max-count-growth", type=float, default=0.25, metavar="FRACTION",
+        help="growth of a group or class count that fails the run")
+    parser.add_argument("--out", metavar="PATH", help="write every sample to PATH (.csv)")
+    args = parser.parse_args(argv)
+
+    from main import Game
+    game = Game(headless=True, seed=args.seed, enemy_store=args.enemy_store, level=args.level)
+    soak = Soak(game, args.policy, args.fire_rate, trace=not args.no_tracemalloc)
+    soak.run(args.hours, args.sample_every, args.warmup)
+
+    trends = soak.trends(args.warmup)
+    failed = failures(trends, args.hours - args.warmup, args.max_memory_growth,
+        args.max_cost_growth, args.max_count_growth)
+    print_report(soak, trends, failed)
+    if args.out:
+        save(args.out, soak.series)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import math
+
+# uniform grid (spatial hash) over entity bounding boxes. entities are
+# registered in every cell their box touches and re-registered by
+# Entity.move() when they cross a cell border, so queries only look at
+# the entities near the query point instead of the whole group
+
+class SpatialHash:
+    def __init__(self, cell_size=100):
+        self.cell_size = cell_size
+        self.cells = {} # (cx, cy) -> {entity: None} (dict keeps insertion order)
+        self.entity_cells = {} # entity -> (cx0, cy0, cx1, cy1)
+
+    def __len__(self):
+        return len(self.entity_cells)
+
+    def __iter__(self):
+        return iter(list(self.entity_cells))
+
+    def __contains__(self, entity):
+        return entity in self.entity_cells
+
+    # cell range covered by an (inclusive) box
+    def cell_range(self, x, y, width, height):
+        size = self.cell_size
+        return (int(x // size), int(y // size),
+                int((x + width) // size), int((y + height) // size))
+
+    def insert(self, entity):
+        bounds = self.cell_range(entity.x, entity.y, entity.width, entity.height)
+        self.entity_cells[entity] = bounds
+        self._add_to_cells(entity, bounds)
+        entity.spatial_index = self
+
+    def remove(self, entity):
+        bounds = self.entity_cells.pop(entity, None)
+        if bounds is not None:
+            self._remove_from_cells(entity, bounds)
+        if entity.spatial_index is self:
+            entity.spatial_index = None
+
+    # move an entity to the cells of its current position (called on move)
+    def update(self, entity):
+        # cell_range() inlined, this runs for every move of every entity
+        size = self.cell_size
+        x, y = entity.x, entity.y
+        bounds = (int(x // size), int(y // size),
+                  int((x + entity.width) // size), int((y + entity.height) // size))
+        old_bounds = self.entity_cells[entity]
+        if bounds == old_bounds:
+            return
+        self._remove_from_cells(entity, old_bounds)
+        self._add_to_cells(entity, bounds)
+        self.entity_cells[entity] = bounds
+
+    def _add_to_cells(self, entity, bounds):
+        cx0, cy0, cx1, cy1 = bounds
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell is None:
+                    self.cells[(cx, cy)] = cell = {}
+                cell[entity] = None
+
+    def _remove_from_cells(self, entity, bounds):
+        cx0, cy0, cx1, cy1 = bounds
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = self.cells[(cx, cy)]
+                del cell[entity]
+                if not cell:
+                    del self.cells[(cx, cy)]
+
+    # every entity in the cells overlapping a box (no duplicates)
+    def candidates(self, x, y, width=0, height=0):
+        cx0, cy0, cx1, cy1 = self.cell_range(x, y, width, height)
+        if cx0 == cx1 and cy0 == cy1:
+            return list(self.cells.get((cx0, cy0), ()))
+
+        res = {}
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell:
+                    res.update(cell)
+        return list(res)
+
+    # entities whose box contains the point (x, y)
+    def query_point(self, x, y):
+        return [entity for entity in self.candidates(x, y) if entity.lies_on(x, y)]
+
+    # entities whose center is within radius of (x, y)
+    def query_radius(self, x, y, radius):
+        res = []
+        for entity in self.candidates(x - radius, y - radius, radius * 2, radius * 2):
+            entity_x, entity_y = entity.rect.center
+            dx = entity_x - x
+            dy = entity_y - y
+            if math.sqrt(dx**2 + dy**2) <= radius:
+                res.append(entity)
+        return res
+
+    # entities that fully enclose another entity
+    def query_enclosing(self, entity):
+        # anything enclosing the entity must cover its top-left corner's cell
+        return [other for other in self.candidates(entity.x, entity.y)
+                if other is not entity and other.encloses(entity)]
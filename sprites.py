@@ -0,0 +1,34 @@
+from utils import get_image
+
+# sprite registry. the images an entity switches between (facing left or
+# right, alive or dead) are declared once as a SpriteSheet and resolved to
+# their surfaces when the game loads its images. entities keep the surfaces
+# and swap self.image on a state change, instead of calling
+# utils.get_image() (key tuple, dict lookups) every frame
+
+sheets = [] # every SpriteSheet, resolved by resolve_all()
+
+class SpriteSheet:
+    def __init__(self, images, width, height):
+        self.images = images # variant -> image file
+        self.width = width
+        self.height = height
+        self.surfaces = None # variant -> surface, once resolved
+        sheets.append(self)
+
+    def resolve(self):
+        self.surfaces = {variant: get_image(image, self.width, self.height)
+            for variant, image in self.images.items()}
+        return self.surfaces
+
+    # the surface of a variant (resolved on first use if the game hasn't)
+    def __getitem__(self, variant):
+        surfaces = self.surfaces
+        if surfaces is None:
+            surfaces = self.resolve()
+        return surfaces[variant]
+
+# resolve every sheet, after the atlas is loaded (see Game.__init__())
+def resolve_all():
+    for sheet in sheets:
+        sheet.resolve()
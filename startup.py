@@ -0,0 +1,108 @@
+import importlib.abc
+import sys
+import time
+from contextlib import contextmanager
+
+# startup time report. when run as a script, main.py imports this first and
+# calls begin() to time its imports, init steps are wrapped in step(), and
+# finish() is called after the first frame. --startup-report prints where
+# the time between launch and the first frame went
+
+START = time.perf_counter()
+
+class StartupReport:
+    def __init__(self):
+        self.imports = [] # (module, ms) including the modules it imports
+        self.steps = [] # (step, ms)
+        self.tracker = None
+        self.active = False # only record while the game is starting up
+        self.total_ms = None # launch to the end of the first frame
+
+    @contextmanager
+    def step(self, name):
+        if not self.active:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, (time.perf_counter() - start) * 1000))
+
+    # start recording, imports made from now on are timed
+    def begin(self):
+        self.active = True
+        if self.tracker is None:
+            self.tracker = ImportTracker(self)
+            sys.meta_path.insert(0, self.tracker)
+
+    # stop recording (after the first frame)
+    def finish(self):
+        self.total_ms = (time.perf_counter() - START) * 1000
+        self.active = False
+        if self.tracker is not None:
+            sys.meta_path.remove(self.tracker)
+            self.tracker = None
+
+    def print(self, top=15):
+        total = self.total_ms
+        if total is None:
+            total = (time.perf_counter() - START) * 1000
+        print(f"startup: {total:.1f} ms")
+        print("  imports (cumulative):")
+        # only top-level imports, nested ones are included in their parent's time
+        for module, ms in sorted(self.imports, key=lambda i: -i[1])[:top]:
+            print(f"    {module:<32}{ms:>9.1f} ms")
+        print("  steps:")
+        for name, ms in self.steps:
+            print(f"    {name:<32}{ms:>9.1f} ms")
+
+# times module execution by wrapping the loaders of modules found by the
+# rest of sys.meta_path. only the outermost import of a chain is recorded
+class ImportTracker(importlib.abc.MetaPathFinder):
+    def __init__(self, report):
+        self.report = report
+        self.depth = 0
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+class TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader, tracker):
+        self.loader = loader
+        self.tracker = tracker
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        # put the real loader back, code that inspects __loader__ shouldn't
+        # see this wrapper
+        module.__loader__ = self.loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self.loader
+
+        tracker = self.tracker
+        tracker.depth += 1
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            tracker.depth -= 1
+            if tracker.depth == 0:
+                tracker.report.imports.append(
+                    (module.__name__, (time.perf_counter() - start) * 1000))
+
+    # anything else (get_resource_reader, is_package...) goes to the real loader
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+report = StartupReport()
@@ -0,0 +1,25 @@
+# game time. everything that used to read pygame.time.get_ticks() directly
+# reads the game's timer instead, a FixedTimer advanced once per tick, so
+# the simulation runs the same in real time, headless and in replays
+
+# speeds are in pixels per REFERENCE_STEP ms (a 60 fps frame) and
+# accelerations in pixels per REFERENCE_STEP ms squared. every update takes
+# dt, the length of the tick in reference steps, so the game runs at the
+# same speed whatever the tick rate
+REFERENCE_STEP = 1000 / 60
+
+# dt of a tick of step ms
+def tick_dt(step):
+    return step / REFERENCE_STEP
+
+class FixedTimer:
+    # simulated time that only moves when advance() is called
+    def __init__(self, step=1000 / 60, start=0):
+        self.step = step # ms per tick
+        self.ticks = start
+
+    def get_ticks(self):
+        return int(self.ticks)
+
+    def advance(self):
+        self.ticks += self.step
@@ -1,20 +1,96 @@
 import pygame
 import os
 import math
+from collections import OrderedDict
 
-cache = {}
 DEFAULTDIR = "assets"
 
+# scaled images keyed by (image, width, height). atlas_images is filled once
+# at startup from the prebuilt sprite atlas (see atlas.py), anything else is
+# decoded and scaled on first use into the bounded LRU cache and remembered
+# in new_images so the atlas can be rebuilt with it on exit
+atlas_images = {}
+cache = OrderedDict()
+CACHE_SIZE = 64
+new_images = set()
+
 def get_image(image: str, width=100, height=100):
+    image_key = (image, width, height)
+    surface = atlas_images.get(image_key)
+    if surface is not None:
+        return surface
+
+    surface = cache.get(image_key)
+    if surface is not None:
+        cache.move_to_end(image_key)
+        return surface
+
+    surface = load_scaled(image, width, height)
+    cache[image_key] = surface
+    if len(cache) > CACHE_SIZE:
+        cache.popitem(last=False)
+    new_images.add(image_key)
+    return surface
+
+# decode and scale an image from the assets directory
+def load_scaled(image: str, width, height):
     imagepath = os.path.join(DEFAULTDIR, image)
-    image_key = f"{imagepath.strip()} width={width} height={height}"
-    if image_key in cache:
-        pass
-    else:
-        image = pygame.image.load(imagepath).convert_alpha()
-        image = pygame.transform.scale(image, (width, height))
-        cache[image_key] = image
-    return cache[image_key]
+    surface = pygame.image.load(imagepath).convert_alpha()
+    return pygame.transform.scale(surface, (width, height))
+
+# fonts are loaded on first use: a font file in the assets directory or a
+# system font name. nothing font related is initialized until text is drawn,
+# so headless runs never pay for it
+fonts = {}
+
+def get_font(name: str, size):
+    key = (name, size)
+    font = fonts.get(key)
+    if font is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        path = os.path.join(DEFAULTDIR, name)
+        if os.path.exists(path):
+            font = pygame.font.Font(path, size)
+        else:
+            font = pygame.font.SysFont(name, size)
+        fonts[key] = font
+    return font
+
+# bounded LRU cache of rendered text surfaces keyed by
+# (font, text, color, antialias). damage numbers, "+100"s and the score
+# repeat a lot, so most frames never have to call Font.render()
+class TextCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.maxsize:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+        self.hits = 0
+        self.misses = 0
+
+text_cache = TextCache()
+
+def render_text(font, text: str, color, antialias=True):
+    return text_cache.render(font, text, color, antialias)
 
 # find distance from coords1(x1, y1) to coords2(x2, y2)
 def distance(coords1: tuple, coords2: tuple):